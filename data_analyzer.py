@@ -3,12 +3,86 @@ Gold Price Data Analyzer
 Provides analytics and insights from historical gold price data
 """
 
-import csv
 import os
+import atexit
+import json
+import tempfile
+import threading
+import weakref
+from functools import lru_cache
 from datetime import datetime, timedelta
 from typing import List, Dict, Optional, Tuple
 from collections import defaultdict
-import statistics
+
+import numpy as np
+import pandas as pd
+
+# pyarrow reads the file with its own large buffered I/O; the C engine is
+# told to memory-map the file instead of going through 8KB reads
+try:
+    import pyarrow  # noqa: F401
+    CSV_ENGINE = 'pyarrow'
+    CSV_READ_OPTIONS = {}
+except ImportError:
+    CSV_ENGINE = 'c'
+    CSV_READ_OPTIONS = {'memory_map': True}
+
+CSV_COLUMNS = ['timestamp', 'company', 'gold_type', 'buy_price', 'sell_price', 'location']
+# Trend results persisted next to the CSV (as JSON, '.<csv name>.trends.json')
+# so a fresh process can answer repeated queries without parsing the file again.
+# Entries are keyed by the day the lookback window starts, so any process
+# asking the same question on the same day finds them
+DISK_CACHE_SUFFIX = '.trends.json'
+DISK_CACHE_MAX_ENTRIES = 256
+# New results are written out by a background timer, batched over this many
+# seconds, and any still pending when the process exits are written then
+DISK_CACHE_FLUSH_DELAY = 30.0
+
+# Analyzers whose pending disk-cache writes are flushed at exit
+_live_analyzers = weakref.WeakSet()
+
+
+@atexit.register
+def _flush_disk_caches():
+    """Write out trend results still waiting for their timer"""
+    for analyzer in list(_live_analyzers):
+        analyzer._flush_disk_cache()
+
+CSV_DTYPES = {
+    'timestamp': str,
+    'company': str,
+    'gold_type': str,
+    'location': str,
+    'buy_price': 'float64',
+    'sell_price': 'float64',
+}
+
+
+def _timestamp_key(moment: datetime) -> str:
+    """
+    Format a cutoff so it can be compared directly against CSV timestamp strings.
+    A midnight cutoff is just the date, so date-only rows of that day still match.
+    """
+    if moment.time() == datetime.min.time():
+        return moment.strftime('%Y-%m-%d')
+    return moment.strftime('%Y-%m-%d %H:%M:%S')
+
+
+def _latest_rows(frame: pd.DataFrame, by: str) -> pd.DataFrame:
+    """
+    Latest row per `by` group of a frame sorted by timestamp.
+    Among rows sharing the latest timestamp the first one in the file wins.
+    """
+    return (frame.drop_duplicates([by, 'timestamp'], keep='first')
+            .drop_duplicates(by, keep='last'))
+
+
+def _mean_std(values: np.ndarray) -> Tuple[float, float]:
+    """Mean and sample standard deviation (ddof=1), reusing the mean for the deviations"""
+    mean = values.mean()
+    deviations = values - mean
+    std = np.sqrt(np.dot(deviations, deviations) / (len(values) - 1))
+    return float(mean), float(std)
 
 
 class GoldPriceAnalyzer:
@@ -16,54 +90,207 @@ class GoldPriceAnalyzer:
     
     def __init__(self, csv_file: str = 'historical_data/historical_gold_prices.csv'):
         self.csv_file = csv_file
-        self.data = self.load_data()
+        self._mtime = None
+        self._size = None
+        self._data = None
+        self._data_version = 0
+        # Bounded memo of trend results shared by all the analytics; the data
+        # version in the key retires entries built from an older load
+        self._cached_trends = lru_cache(maxsize=64)(
+            lambda company, cutoff, location, gold_type, version:
+                self._disk_cached_trends(company, cutoff, location, gold_type))
+        csv_dir, csv_name = os.path.split(csv_file)
+        self._disk_cache_path = os.path.join(csv_dir, '.' + csv_name + DISK_CACHE_SUFFIX)
+        self._disk_cache = {}
+        self._disk_cache_lock = threading.Lock()
+        self._disk_cache_timer = None
+        _live_analyzers.add(self)
+        self._company_index = {}
+        self._series_index = {}
+        self._company_frames = {}
+        self._columns = {}
+        self._time_sorted = False
+        self.reload_data()
+    
+    @property
+    def data(self) -> pd.DataFrame:
+        """Loaded rows; the CSV is parsed on first use after it changes"""
+        self._ensure_loaded()
+        return self._data
     
-    def load_data(self) -> List[Dict]:
+    def _ensure_loaded(self):
+        """Parse the CSV and build the lookup structures if not done since the last change"""
+        if self._data is None:
+            self._data = self.load_data()
+            # The collector writes the CSV in timestamp order, so per-call sorts
+            # are normally unnecessary
+            self._time_sorted = bool(self._data['timestamp'].is_monotonic_increasing)
+            self._build_indices()
+            self._columns = {column: self._data[column].to_numpy()
+                             for column in ('timestamp', 'date_only', 'buy_price', 'sell_price')}
+    
+    def load_data(self) -> pd.DataFrame:
         """Load data from CSV file"""
         if not os.path.exists(self.csv_file):
-            return []
-        
-        rows = []
-        with open(self.csv_file, 'r', encoding='utf-8') as csvfile:
-            reader = csv.DictReader(csvfile)
-            for row in reader:
-                # Convert price strings to floats
-                if row.get('buy_price'):
-                    row['buy_price'] = float(row['buy_price'])
-                if row.get('sell_price'):
-                    row['sell_price'] = float(row['sell_price'])
-                rows.append(row)
-        
-        return rows
+            df = pd.DataFrame(columns=CSV_COLUMNS).astype(CSV_DTYPES)
+        else:
+            # Parse and convert prices in C (or pyarrow) instead of row by row,
+            # skipping any columns the analytics never look at
+            df = pd.read_csv(self.csv_file, engine=CSV_ENGINE, usecols=CSV_COLUMNS, dtype=CSV_DTYPES,
+                             keep_default_na=False, na_values={'buy_price': [''], 'sell_price': ['']},
+                             **CSV_READ_OPTIONS)
+
+        # Normalize company once and keep the low-cardinality text columns as
+        # categories, so filters compare small integer codes instead of strings.
+        # Timestamps stay as ISO strings: they sort and compare correctly as text.
+        df['company'] = df['company'].str.upper().astype('category')
+        df['gold_type'] = df['gold_type'].astype('category')
+        df['location'] = df['location'].astype('category')
+        df['date_only'] = df['timestamp'].str[:10]
+
+        # Store prices as float32 when that is lossless (whole or coarse VND
+        # amounts), halving the price columns; analytics upcast to float64
+        for column in ('buy_price', 'sell_price'):
+            prices = df[column].to_numpy()
+            narrow = prices.astype(np.float32)
+            if np.array_equal(narrow, prices, equal_nan=True):
+                df[column] = narrow
+        return df
     
     def reload_data(self):
-        """Reload data from CSV file to get latest updates"""
-        self.data = self.load_data()
+        """Reload data from CSV file if it changed since the last load"""
+        try:
+            stat = os.stat(self.csv_file)
+            mtime, size = stat.st_mtime_ns, stat.st_size
+        except OSError:
+            mtime = size = None
+        if mtime == self._mtime and size == self._size and mtime is not None:
+            return
+
+        self._data = None
+        self._mtime = mtime
+        self._size = size
+        self._data_version += 1
+        self._load_disk_cache()
+    
+    def _build_indices(self):
+        """Map company and (company, location, gold_type) to row positions"""
+        self._company_index = self._data.groupby('company', observed=True, dropna=False).indices
+        self._series_index = self._data.groupby(['company', 'location', 'gold_type'],
+                                               observed=True, dropna=False).indices
+        self._company_frames = {}
+    
+    def _disk_cache_header(self) -> Dict:
+        """Identify the CSV contents the cached results were built from"""
+        return {'csv': os.path.basename(self.csv_file), 'size': self._size, 'mtime_ns': self._mtime}
+
+    def _load_disk_cache(self):
+        """Load persisted trend results if they were built from the current CSV"""
+        with self._disk_cache_lock:
+            self._disk_cache = {}
+            if self._disk_cache_timer is not None:
+                self._disk_cache_timer.cancel()
+                self._disk_cache_timer = None
+        if self._mtime is None:
+            return
+        try:
+            with open(self._disk_cache_path, 'r', encoding='utf-8') as f:
+                cached = json.load(f)
+        except (OSError, ValueError):
+            return
+        if not isinstance(cached, dict) or cached.get('source') != self._disk_cache_header():
+            return
+        entries = {}
+        try:
+            for key, trends in cached['entries']:
+                buy_prices = np.asarray(trends['buy_prices'], dtype=np.float64)
+                sell_prices = np.asarray(trends['sell_prices'], dtype=np.float64)
+                buy_prices.flags.writeable = False
+                sell_prices.flags.writeable = False
+                entries[tuple(key)] = {'dates': trends['dates'],
+                                       'buy_prices': buy_prices,
+                                       'sell_prices': sell_prices}
+        except (KeyError, TypeError, ValueError):
+            return
+        with self._disk_cache_lock:
+            self._disk_cache = entries
+
+    def _schedule_disk_cache_save(self):
+        """Write the cache from a background timer, once per batch of new results"""
+        if self._disk_cache_timer is None:
+            timer = threading.Timer(DISK_CACHE_FLUSH_DELAY, self._save_disk_cache,
+                                    args=(self._data_version,))
+            timer.daemon = True
+            self._disk_cache_timer = timer
+            timer.start()
+
+    def _flush_disk_cache(self):
+        """Write pending results now instead of waiting for the timer"""
+        with self._disk_cache_lock:
+            timer = self._disk_cache_timer
+            if timer is None:
+                return
+            timer.cancel()
+        self._save_disk_cache(self._data_version)
+
+    def _save_disk_cache(self, version: int):
+        """Write the trend results for the current CSV, replacing the file atomically"""
+        with self._disk_cache_lock:
+            self._disk_cache_timer = None
+            if version != self._data_version:
+                return
+            source = self._disk_cache_header()
+            entries = [[list(key), {'dates': trends['dates'],
+                                    'buy_prices': trends['buy_prices'].tolist(),
+                                    'sell_prices': trends['sell_prices'].tolist()}]
+                       for key, trends in self._disk_cache.items()]
+        cache_dir = os.path.dirname(self._disk_cache_path) or '.'
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix='.tmp')
+        except OSError:
+            return
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump({'source': source, 'entries': entries}, f)
+            os.replace(tmp_path, self._disk_cache_path)
+        except OSError:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+
+    def _disk_cached_trends(self, company: str, cutoff: Optional[str],
+                            location: Optional[str], gold_type: Optional[str]) -> Dict:
+        """Trend results from the disk cache, computing them on a miss; new results reach disk later"""
+        # Day granularity: a minute-precise cutoff would never recur in a later process
+        key = (company, cutoff[:10] if cutoff else None, location, gold_type)
+        trends = self._disk_cache.get(key)
+        if trends is None:
+            trends = self._compute_trends(company, cutoff, location, gold_type)
+            if self._mtime is not None:
+                with self._disk_cache_lock:
+                    self._disk_cache[key] = trends
+                    while len(self._disk_cache) > DISK_CACHE_MAX_ENTRIES:
+                        del self._disk_cache[next(iter(self._disk_cache))]
+                    self._schedule_disk_cache_save()
+        return trends
     
-    def filter_by_company(self, company: str) -> List[Dict]:
+    def filter_by_company(self, company: str) -> pd.DataFrame:
         """Filter data by company"""
-        return [row for row in self.data if row['company'].upper() == company.upper()]
+        company = company.upper()
+        data = self.data
+        frame = self._company_frames.get(company)
+        if frame is None:
+            # Built on first use and kept until the next reload
+            positions = self._company_index.get(company)
+            frame = data.iloc[:0] if positions is None else data.take(positions)
+            self._company_frames[company] = frame
+        return frame
     
-    def filter_by_date_range(self, days_back: int) -> List[Dict]:
+    def filter_by_date_range(self, days_back: int) -> pd.DataFrame:
         """Filter data by date range (last N days)"""
-        cutoff_date = datetime.now() - timedelta(days=days_back)
-        
-        filtered = []
-        for row in self.data:
-            try:
-                # Parse timestamp (format: YYYY-MM-DD HH:MM:SS or YYYY-MM-DD)
-                timestamp_str = row['timestamp']
-                if ' ' in timestamp_str:
-                    row_date = datetime.strptime(timestamp_str, '%Y-%m-%d %H:%M:%S')
-                else:
-                    row_date = datetime.strptime(timestamp_str, '%Y-%m-%d')
-                
-                if row_date >= cutoff_date:
-                    filtered.append(row)
-            except (ValueError, KeyError):
-                continue
-        
-        return filtered
+        cutoff = _timestamp_key(datetime.now().replace(microsecond=0) - timedelta(days=days_back))
+        return self.data[self.data['timestamp'] >= cutoff]
     
     def get_price_trends(self, company: str, days_back: int = 7,
                         location: str = None, gold_type: str = None) -> Dict:
@@ -77,61 +304,78 @@ class GoldPriceAnalyzer:
             gold_type: Gold type filter (e.g., 'SJC 1L', 'DOJI Gold Bar', 'PNJ 24K Ring')
 
         Returns:
-            Dictionary with dates, buy prices, and sell prices
+            Dictionary with dates (list of timestamps) and buy/sell prices
+            (read-only float64 NumPy arrays)
         """
         # Reload data to get latest updates from CSV
         self.reload_data()
-        
-        # Filter data
-        company_data = self.filter_by_company(company)
 
-        # If gold_type is specified, filter by it
-        if gold_type:
-            company_data = [row for row in company_data if row.get('gold_type') == gold_type]
+        return self._cached_trends(company.upper(), self._cutoff(days_back),
+                                   location, gold_type, self._data_version)
+
+    def _by_time(self, frame: pd.DataFrame) -> pd.DataFrame:
+        """Frame rows in timestamp order (file order kept for ties)"""
+        if self._time_sorted:
+            return frame
+        return frame.sort_values('timestamp', kind='stable')
+
+    def _cutoff(self, days_back: int) -> Optional[str]:
+        """Start of the lookback window, truncated to the minute so repeated calls can share a result"""
+        if not days_back:
+            return None
+        return _timestamp_key((datetime.now() - timedelta(days=days_back)).replace(second=0, microsecond=0))
+
+    def _compute_trends(self, company: str, cutoff: Optional[str],
+                        location: Optional[str], gold_type: Optional[str]) -> Dict:
+        """Filter, sort and deduplicate rows into per-day trend series"""
+        # Filter data: pick the (company, location, gold_type) series that match
+        self._ensure_loaded()
+        company = company.upper()
+        series = [key for key in self._series_index
+                  if key[0] == company and (not gold_type or key[2] == gold_type)]
 
         # If no location specified, use the first available location for this company
-        if location is None and company_data:
-            location = company_data[0].get('location', 'National')
+        if location is None and series:
+            location = min(series, key=lambda key: self._series_index[key][0])[1]
 
-        date_filtered = [row for row in company_data
-                        if row.get('location') == location]
-        
-        # Sort by timestamp
-        date_filtered.sort(key=lambda x: x['timestamp'])
+        # The rest of the pipeline works on row positions over the column arrays,
+        # so no intermediate frame is built between the filter, sort and dedup
+        series_positions = [self._series_index[key] for key in series if key[1] == location]
+        if series_positions:
+            # Keep file order so ties on timestamp resolve as before
+            positions = np.sort(np.concatenate(series_positions))
+        else:
+            positions = np.empty(0, dtype=np.intp)
+        stamps = self._columns['timestamp'][positions]
         
         # Get last N days
-        if days_back:
-            cutoff_date = datetime.now() - timedelta(days=days_back)
-            date_filtered = [row for row in date_filtered 
-                           if self._parse_date(row['timestamp']) >= cutoff_date]
-        
-        # Deduplicate by date - keep only the latest entry for each date
-        date_map = {}
-        for row in date_filtered:
-            # Extract just the date part (YYYY-MM-DD)
-            timestamp_str = row['timestamp']
-            date_part = timestamp_str.split(' ')[0] if ' ' in timestamp_str else timestamp_str
-            
-            # Keep the latest entry for each date (since data is sorted by timestamp)
-            if date_part not in date_map:
-                date_map[date_part] = row
-            else:
-                # Compare timestamps and keep the later one
-                existing_ts = date_map[date_part]['timestamp']
-                if timestamp_str > existing_ts:
-                    date_map[date_part] = row
-        
-        # Extract trends from deduplicated data
-        dates = []
-        buy_prices = []
-        sell_prices = []
-        
-        # Sort by date to maintain chronological order
-        for date_part in sorted(date_map.keys()):
-            row = date_map[date_part]
-            dates.append(row['timestamp'])
-            buy_prices.append(row.get('buy_price', 0))
-            sell_prices.append(row.get('sell_price', 0))
+        if cutoff is not None:
+            in_window = stamps >= cutoff
+            positions, stamps = positions[in_window], stamps[in_window]
+        
+        # Sort by timestamp
+        if not self._time_sorted:
+            order = np.argsort(stamps, kind='stable')
+            positions, stamps = positions[order], stamps[order]
+        
+        # Deduplicate by date - keep only the latest entry for each date.
+        # Equal timestamps and equal dates are now adjacent: take the first row
+        # of each timestamp run, then the last of each date run.
+        first_of_stamp = np.ones(len(stamps), dtype=bool)
+        first_of_stamp[1:] = stamps[1:] != stamps[:-1]
+        positions = positions[first_of_stamp]
+        days = self._columns['date_only'][positions]
+        last_of_day = np.ones(len(days), dtype=bool)
+        last_of_day[:-1] = days[1:] != days[:-1]
+        positions = positions[last_of_day]
+        
+        # Already in chronological order: rows were sorted by timestamp above
+        dates = self._columns['timestamp'][positions].tolist()
+        buy_prices = self._columns['buy_price'][positions].astype(np.float64)
+        sell_prices = self._columns['sell_price'][positions].astype(np.float64)
+        # Results are cached and shared between callers
+        buy_prices.flags.writeable = False
+        sell_prices.flags.writeable = False
         
         return {
             'dates': dates,
@@ -148,7 +392,7 @@ class GoldPriceAnalyzer:
         """
         trends = self.get_price_trends(company, days_back)
         
-        if not trends['buy_prices'] or len(trends['buy_prices']) < 2:
+        if len(trends['buy_prices']) < 2:
             return {
                 'buy_change': 0,
                 'sell_change': 0,
@@ -157,10 +401,10 @@ class GoldPriceAnalyzer:
             }
         
         # Calculate changes
-        buy_start = trends['buy_prices'][0]
-        buy_end = trends['buy_prices'][-1]
-        sell_start = trends['sell_prices'][0]
-        sell_end = trends['sell_prices'][-1]
+        buy_start = float(trends['buy_prices'][0])
+        buy_end = float(trends['buy_prices'][-1])
+        sell_start = float(trends['sell_prices'][0])
+        sell_end = float(trends['sell_prices'][-1])
         
         buy_change = buy_end - buy_start
         sell_change = sell_end - sell_start
@@ -185,7 +429,7 @@ class GoldPriceAnalyzer:
         """
         trends = self.get_price_trends(company, days_back)
         
-        if not trends['buy_prices'] or len(trends['buy_prices']) < 2:
+        if len(trends['buy_prices']) < 2:
             return {
                 'buy_volatility': 0,
                 'sell_volatility': 0,
@@ -196,14 +440,11 @@ class GoldPriceAnalyzer:
         buy_prices = trends['buy_prices']
         sell_prices = trends['sell_prices']
         
-        # Calculate standard deviation
-        buy_std = statistics.stdev(buy_prices) if len(buy_prices) > 1 else 0
-        sell_std = statistics.stdev(sell_prices) if len(sell_prices) > 1 else 0
+        # Calculate mean and sample standard deviation
+        buy_mean, buy_std = _mean_std(buy_prices)
+        sell_mean, sell_std = _mean_std(sell_prices)
         
         # Calculate coefficient of variation (volatility %)
-        buy_mean = statistics.mean(buy_prices)
-        sell_mean = statistics.mean(sell_prices)
-        
         buy_volatility = (buy_std / buy_mean * 100) if buy_mean else 0
         sell_volatility = (sell_std / sell_mean * 100) if sell_mean else 0
         
@@ -224,7 +465,7 @@ class GoldPriceAnalyzer:
         """
         trends = self.get_price_trends(company, days_back)
         
-        if not trends['buy_prices']:
+        if not len(trends['buy_prices']):
             return {
                 'buy_min': 0,
                 'buy_max': 0,
@@ -237,19 +478,20 @@ class GoldPriceAnalyzer:
         dates = trends['dates']
         
         # Find extremes
-        buy_min_idx = buy_prices.index(min(buy_prices))
-        buy_max_idx = buy_prices.index(max(buy_prices))
-        sell_min_idx = sell_prices.index(min(sell_prices))
-        sell_max_idx = sell_prices.index(max(sell_prices))
+        # One argmin/argmax pass per bound; the values come from the indices
+        buy_min_idx = int(buy_prices.argmin())
+        buy_max_idx = int(buy_prices.argmax())
+        sell_min_idx = int(sell_prices.argmin())
+        sell_max_idx = int(sell_prices.argmax())
         
         return {
-            'buy_min': min(buy_prices),
+            'buy_min': float(buy_prices[buy_min_idx]),
             'buy_min_date': dates[buy_min_idx],
-            'buy_max': max(buy_prices),
+            'buy_max': float(buy_prices[buy_max_idx]),
             'buy_max_date': dates[buy_max_idx],
-            'sell_min': min(sell_prices),
+            'sell_min': float(sell_prices[sell_min_idx]),
             'sell_min_date': dates[sell_min_idx],
-            'sell_max': max(sell_prices),
+            'sell_max': float(sell_prices[sell_max_idx]),
             'sell_max_date': dates[sell_max_idx],
             'period_days': days_back
         }
@@ -261,14 +503,33 @@ class GoldPriceAnalyzer:
         Returns:
             Dictionary with comparison data
         """
+        self.reload_data()
+        df = self.data
         companies = ['SJC', 'DOJI', 'PNJ']
         comparison = {}
         
+        # Same rows get_price_trends would use: each company's first location
+        # in the file, inside the lookback window
+        company_codes = df['company'].cat.codes.to_numpy()
+        location_codes = df['location'].cat.codes.to_numpy()
+        seen, first_rows = np.unique(company_codes, return_index=True)
+        home_location = np.full(len(df['company'].cat.categories), -2, dtype=location_codes.dtype)
+        home_location[seen] = location_codes[first_rows]
+        mask = location_codes == home_location[company_codes]
+        
+        cutoff = self._cutoff(days_back)
+        if cutoff is not None:
+            mask &= (df['timestamp'] >= cutoff).to_numpy()
+        
+        # One pass for every company: the latest row of each
+        candidates = self._by_time(df[mask])
+        latest = _latest_rows(candidates, 'company')
+        latest_prices = dict(zip(latest['company'], zip(latest['buy_price'].tolist(),
+                                                        latest['sell_price'].tolist())))
+        
         for company in companies:
-            trends = self.get_price_trends(company, days_back)
-            if trends['buy_prices']:
-                latest_buy = trends['buy_prices'][-1]
-                latest_sell = trends['sell_prices'][-1]
+            if company in latest_prices:
+                latest_buy, latest_sell = latest_prices[company]
                 
                 comparison[company] = {
                     'latest_buy': latest_buy,
@@ -293,7 +554,7 @@ class GoldPriceAnalyzer:
         """
         trends = self.get_price_trends(company, days_back)
         
-        if not trends['buy_prices'] or len(trends['buy_prices']) < window:
+        if len(trends['buy_prices']) < window:
             return {
                 'dates': [],
                 'buy_ma': [],
@@ -304,32 +565,25 @@ class GoldPriceAnalyzer:
         sell_prices = trends['sell_prices']
         dates = trends['dates']
         
-        buy_ma = []
-        sell_ma = []
-        ma_dates = []
-        
-        for i in range(len(buy_prices) - window + 1):
-            buy_window = buy_prices[i:i+window]
-            sell_window = sell_prices[i:i+window]
-            
-            buy_ma.append(statistics.mean(buy_window))
-            sell_ma.append(statistics.mean(sell_window))
-            ma_dates.append(dates[i+window-1])
+        # O(N) rolling mean from prefix sums instead of O(N*W) convolution
+        buy_sums = np.concatenate(([0.0], np.cumsum(buy_prices)))
+        sell_sums = np.concatenate(([0.0], np.cumsum(sell_prices)))
+        buy_ma = (buy_sums[window:] - buy_sums[:-window]) / window
+        sell_ma = (sell_sums[window:] - sell_sums[:-window]) / window
+        ma_dates = dates[window - 1:]
         
         return {
             'dates': ma_dates,
-            'buy_ma': buy_ma,
-            'sell_ma': sell_ma,
+            'buy_ma': buy_ma.tolist(),
+            'sell_ma': sell_ma.tolist(),
             'window': window
         }
     
     def _parse_date(self, timestamp_str: str) -> datetime:
         """Parse timestamp string to datetime object"""
         try:
-            if ' ' in timestamp_str:
-                return datetime.strptime(timestamp_str, '%Y-%m-%d %H:%M:%S')
-            else:
-                return datetime.strptime(timestamp_str, '%Y-%m-%d')
+            # Handles both 'YYYY-MM-DD' and 'YYYY-MM-DD HH:MM:SS' without strptime's format parser
+            return datetime.fromisoformat(timestamp_str)
         except ValueError:
             return datetime.min
 
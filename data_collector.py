@@ -4,36 +4,254 @@ Fetches and stores historical gold price data from all companies
 """
 
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import argparse
 import csv
+import heapq
+import inspect
+import itertools
+import json
 import os
-from datetime import datetime, timedelta
-from typing import List, Dict, Optional
+import shutil
+import sys
+import tempfile
+import threading
+from operator import itemgetter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Iterator, List, Dict, Optional, Set, TextIO, Tuple
 import time
+from dataclasses import dataclass
+
+# urllib3 2.x accepts Retry(backoff_max=...); 1.26 raises TypeError on it
+_RETRY_HAS_BACKOFF_MAX = 'backoff_max' in inspect.signature(Retry.__init__).parameters
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 try:
     from config import API_KEY
 except ImportError:
     API_KEY = None
 
+# Vietnam time (UTC+7, no DST). A fixed offset formats API timestamps without
+# a per-call localtime() lookup and needs no tzdata on Windows
+VN_TZ = timezone(timedelta(hours=7))
+
+
+def vn_now() -> datetime:
+    """Current Vietnam wall-clock time as a naive datetime, comparable with CSV timestamps"""
+    return datetime.now(VN_TZ).replace(tzinfo=None)
+
+
+# Column layout of the historical CSV; names are interned once since every
+# dict built by load_csv_data reuses them as keys
+_CSV_HEADER = tuple(sys.intern(column) for column in
+                    ('timestamp', 'company', 'gold_type', 'buy_price', 'sell_price', 'location'))
+
+
+def _parse_json_response(response: requests.Response) -> Any:
+    """Decode a JSON response body, with orjson when it is installed"""
+    if orjson is None:
+        return response.json()
+    try:
+        return orjson.loads(response.content)
+    except orjson.JSONDecodeError as e:
+        # Surface the same exception type as response.json() so callers'
+        # RequestException handling still applies
+        raise requests.exceptions.JSONDecodeError(e.msg, e.doc, e.pos)
+
+
+class _RateLimiter:
+    """
+    Thread-safe token bucket: allows bursts of up to `rate` calls, then
+    paces callers to `rate` calls per `period` seconds
+    """
+
+    def __init__(self, rate: float, period: float = 1.0):
+        self.capacity = rate
+        self.fill_rate = rate / period
+        self.tokens = rate
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Take one token, sleeping only if the bucket is empty"""
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.fill_rate)
+            self.updated = now
+            self.tokens -= 1
+            # A negative balance is the caller's wait for its token
+            wait = -self.tokens / self.fill_rate if self.tokens < 0 else 0
+        if wait:
+            time.sleep(wait)
+
+
+class _UnsortedCSVError(Exception):
+    """The CSV being merged into is not in timestamp order"""
+
+
+def _temp_path_beside(path: str) -> str:
+    """Create an empty, uniquely named temp file in path's directory and return its name"""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or '.',
+                                    prefix='.' + os.path.basename(path) + '.', suffix='.tmp')
+    os.close(fd)
+    return tmp_path
+
+
+@dataclass
+class AppendResult:
+    """Row counts from one append_to_csv call"""
+    existing: int = 0    # data rows in the file before the append
+    added: int = 0       # new rows (keys not in the file yet)
+    duplicates: int = 0  # incoming rows that replaced an existing row
+    total: Optional[int] = None  # data rows in the file afterwards (None if it wasn't read)
+
 
 class HistoricalDataCollector:
     """Collect and store historical gold price data"""
     
     BASE_URL = "https://vapi.vnappmob.com"
     DATA_DIR = "historical_data"
+    # Historical API responses for ranges ending before today are cached here
+    # for CACHE_TTL seconds
+    CACHE_DIR = os.path.join(DATA_DIR, ".cache")
+    CACHE_TTL = 3600
+    # Upper bound on simultaneous API requests when fetching several companies
+    MAX_CONCURRENT_FETCHES = 4
+
+    # Retries per request (all kinds combined) on connection errors, timeouts and
+    # 5xx responses. The first retry is immediate, then waits double from 2s
+    # (2s, 4s...) up to RETRY_BACKOFF_MAX seconds
+    MAX_RETRIES = 3
+    RETRY_BACKOFF_MAX = 16
+
+    # (connect, read) timeouts in seconds for each attempt. With the API down a
+    # call gives up after (MAX_RETRIES + 1) * 20s plus the waits: 86s here, 40s
+    # for a collector built with max_retries=1 as the API server does
+    REQUEST_TIMEOUT = (5, 15)
+
+    # API requests allowed per second (bursts up to this many go out immediately)
+    API_RATE_LIMIT = 2
+
+    # Upper bound on memoized timestamp strings (see _fmt_ts)
+    TS_CACHE_SIZE = 4096
+
+    # Records before 2024-01-01 (Vietnam time) are skipped
+    _CUTOFF_TS: int = int(datetime(2024, 1, 1, tzinfo=VN_TZ).timestamp())
+
+    # Buffer size for CSV reads and writes; fewer, larger read()/write() calls on big files
+    CSV_BUFFER_SIZE = 1 << 20
+
+    # Bytes read from the end of a sorted CSV to find its latest timestamp
+    TAIL_BYTES = 4096
+
+    # CSVs at least this big are scanned with pandas in count_rows_and_dates
+    PANDAS_MIN_BYTES = 1 << 20
+
+    CSV_FIELDS = list(_CSV_HEADER)
+
+    # Products saved for each company: (gold_type, buy field, sell field, location)
+    SCHEMA = {
+        'sjc': (
+            ('SJC 1L', 'buy_1l', 'sell_1l', 'National'),                                # 1 Lượng
+            # SJC 5C and 1C removed per user request
+            ('SJC Ring 1C', 'buy_nhan1c', 'sell_nhan1c', 'National'),                   # Nhẫn 1 Chỉ
+            ('SJC Jewelry 24K', 'buy_nutrang_9999', 'sell_nutrang_9999', 'National'),   # Nữ Trang 9999
+            ('SJC Jewelry 99%', 'buy_nutrang_99', 'sell_nutrang_99', 'National'),       # Nữ Trang 99
+            ('SJC Jewelry 18K', 'buy_nutrang_75', 'sell_nutrang_75', 'National'),       # Nữ Trang 75
+        ),
+        'doji': (
+            ('Gold Bar', 'buy_hcm', 'sell_hcm', 'Ho Chi Minh City'),
+            ('Gold Bar', 'buy_hn', 'sell_hn', 'Hanoi'),
+            ('Gold Bar', 'buy_ct', 'sell_ct', 'Can Tho'),
+            ('Gold Bar', 'buy_dn', 'sell_dn', 'Da Nang'),
+        ),
+        'pnj': (
+            ('PNJ 24K Ring', 'buy_nhan_24k', 'sell_nhan_24k', 'National'),              # Nhẫn 24K
+            ('PNJ 24K Jewelry', 'buy_nt_24k', 'sell_nt_24k', 'National'),               # Nữ Trang 24K
+            ('PNJ 18K Jewelry', 'buy_nt_18k', 'sell_nt_18k', 'National'),               # Nữ Trang 18K
+            ('PNJ 14K Jewelry', 'buy_nt_14k', 'sell_nt_14k', 'National'),               # Nữ Trang 14K
+            ('PNJ 10K Jewelry', 'buy_nt_10k', 'sell_nt_10k', 'National'),               # Nữ Trang 10K
+        ),
+    }
     
-    def __init__(self, api_key: Optional[str] = None):
+    def __init__(self, api_key: Optional[str] = None, max_retries: Optional[int] = None):
         self.api_key = api_key or API_KEY
+        # Interactive callers pass fewer retries than MAX_RETRIES to fail faster
+        self.max_retries = self.MAX_RETRIES if max_retries is None else max_retries
         self.headers = {
             'Accept': 'application/json'
         }
         if self.api_key:
             self.headers['Authorization'] = f'Bearer {self.api_key}'
+
+        self._ts_cache: Dict[int, Optional[str]] = {}
+        # Dates ('YYYY-MM-DD') present in one CSV file, kept current by append_to_csv
+        # and checked against the file's (st_mtime_ns, st_size) before each use
+        self._dates_cache: Optional[Set[str]] = None
+        self._dates_cache_file: Optional[str] = None
+        self._dates_cache_stat: Optional[Tuple[int, int]] = None
+        # Data rows of that file (None if unknown)
+        self._dates_cache_rows: Optional[int] = None
+        self._dates_lock = threading.Lock()
+        # Serializes CSV rewrites from this collector's threads; otherwise two
+        # merges read the same file and the last os.replace drops the other's rows
+        self._write_lock = threading.Lock()
+        self._limiter = _RateLimiter(self.API_RATE_LIMIT)
+
+        # One pooled keep-alive session for all API calls instead of a new
+        # connection (and TLS handshake) per requests.get. All calls go to
+        # BASE_URL, so a single host pool is enough; it keeps one connection
+        # alive per concurrent fetch thread
+        self.session = requests.Session()
+        self.session.headers.update(self.headers)
+        adapter = HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=self.MAX_CONCURRENT_FETCHES,
+            max_retries=self._build_retry()
+        )
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
         
         # Create data directory if it doesn't exist
         if not os.path.exists(self.DATA_DIR):
             os.makedirs(self.DATA_DIR)
     
+    def _build_retry(self) -> Retry:
+        """
+        Retry policy for API calls: connection errors, read timeouts and 5xx
+        responses are retried with exponential backoff; 4xx responses are not
+        """
+        options = dict(
+            total=self.max_retries,
+            connect=self.max_retries,
+            read=self.max_retries,
+            status=self.max_retries,
+            backoff_factor=1,
+            status_forcelist=[500, 502, 503, 504],
+            allowed_methods=['GET'],
+        )
+        # backoff_max is a urllib3 2.x keyword; 1.26 only has a class-level
+        # cap (120s), which these few retries' waits never reach anyway
+        if _RETRY_HAS_BACKOFF_MAX:
+            options['backoff_max'] = self.RETRY_BACKOFF_MAX
+        return Retry(**options)
+
+    def close(self):
+        """Close the pooled HTTP session"""
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+    
     def fetch_company_data(self, company: str, date_from: str, date_to: str) -> Optional[Dict]:
         """
         Fetch data for a specific company and date range
@@ -61,13 +279,95 @@ class HistoricalDataCollector:
             'date_to': int(date_to_dt.timestamp())
         }
 
+        # Only closed ranges are cached: a range reaching today (Vietnam time)
+        # can still gain prices published later in the day
+        cache_path = None
+        if date_to < vn_now().strftime('%Y-%m-%d'):
+            cache_path = self._cache_path(company, date_from, date_to)
+            cached = self._load_cached_response(cache_path)
+            if cached is not None:
+                return cached
+
         try:
-            response = requests.get(url, headers=self.headers, params=params, timeout=30)
+            self._limiter.acquire()
+            response = self.session.get(url, params=params, timeout=self.REQUEST_TIMEOUT)
             response.raise_for_status()
-            return response.json()
+            result = _parse_json_response(response)
         except requests.exceptions.RequestException as e:
             print(f"Error fetching {company} data: {e}")
             return None
+
+        # Empty responses are not cached so data published later is picked up
+        if cache_path is not None and result and result.get('results'):
+            self._store_cached_response(cache_path, result)
+        return result
+
+    def _cache_path(self, company: str, date_from: str, date_to: str) -> str:
+        """Path of the on-disk response cache entry for a company and date range"""
+        return os.path.join(self.CACHE_DIR, f'{company.lower()}_{date_from}_{date_to}.json')
+
+    def _load_cached_response(self, path: str) -> Optional[Dict]:
+        """Load a cached API response if it is younger than CACHE_TTL, else None"""
+        try:
+            if time.time() - os.path.getmtime(path) >= self.CACHE_TTL:
+                return None
+            with open(path, 'rb') as f:
+                raw = f.read()
+            return orjson.loads(raw) if orjson is not None else json.loads(raw)
+        except (OSError, ValueError):
+            return None
+
+    def _store_cached_response(self, path: str, result: Dict):
+        """Write an API response to the on-disk cache (best effort)"""
+        if orjson is not None:
+            raw = orjson.dumps(result)
+        else:
+            raw = json.dumps(result).encode('utf-8')
+        tmp_path = None
+        try:
+            os.makedirs(self.CACHE_DIR, exist_ok=True)
+            # A unique name, so processes caching the same range never share a temp file
+            tmp_path = _temp_path_beside(path)
+            with open(tmp_path, 'wb') as f:
+                f.write(raw)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"[-] Could not write response cache {path}: {e}")
+        finally:
+            if tmp_path is not None and os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def fetch_current_company_data(self, company: str) -> Optional[Dict]:
+        """
+        Fetch the current prices for a specific company
+
+        Returns:
+            JSON response from API, or None on error
+        """
+        url = f"{self.BASE_URL}/api/v2/gold/{company.lower()}"
+
+        try:
+            self._limiter.acquire()
+            response = self.session.get(url, timeout=self.REQUEST_TIMEOUT)
+            response.raise_for_status()
+            return _parse_json_response(response)
+        except requests.exceptions.RequestException as e:
+            print(f"  [-] Error fetching {company.upper()} data: {e}")
+            return None
+
+    def _fetch_all(self, fetch: Callable[[str], Any], companies: List[str]) -> Dict[str, Any]:
+        """
+        Run fetch(company) for every company, in parallel threads when there is more than one
+
+        Returns:
+            Dictionary with company names as keys and fetch results as values
+        """
+        if len(companies) <= 1:
+            return {company: fetch(company) for company in companies}
+
+        workers = min(self.MAX_CONCURRENT_FETCHES, len(companies))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            return dict(zip(companies, pool.map(fetch, companies)))
     
     def collect_current_prices(self) -> Dict[str, List[Dict]]:
         """
@@ -86,26 +386,20 @@ class HistoricalDataCollector:
 
         for company in companies:
             print(f"Fetching {company.upper()} data...")
-            # Fetch current data (date parameters are ignored by API)
-            url = f"{self.BASE_URL}/api/v2/gold/{company.lower()}"
 
-            try:
-                response = requests.get(url, headers=self.headers, timeout=30)
-                response.raise_for_status()
-                data = response.json()
-
-                if data and 'results' in data:
-                    all_data[company] = data['results']
-                    print(f"  [+] Collected {len(data['results'])} records for {company.upper()}")
-                else:
-                    all_data[company] = []
-                    print(f"  [-] No data available for {company.upper()}")
-            except requests.exceptions.RequestException as e:
-                print(f"  [-] Error fetching {company.upper()} data: {e}")
-                all_data[company] = []
+        # Fetch current data (date parameters are ignored by API); companies are
+        # requested concurrently instead of one after another with sleeps
+        responses = self._fetch_all(self.fetch_current_company_data, companies)
 
-            # Be nice to the API - add a small delay between requests
-            time.sleep(1)
+        for company in companies:
+            data = responses[company]
+            if data and 'results' in data:
+                all_data[company] = data['results']
+                print(f"  [+] Collected {len(data['results'])} records for {company.upper()}")
+            else:
+                all_data[company] = []
+                if data is not None:
+                    print(f"  [-] No data available for {company.upper()}")
 
         return all_data
 
@@ -119,7 +413,7 @@ class HistoricalDataCollector:
         Returns:
             Dictionary with company names as keys and list of price records as values
         """
-        date_to = datetime.now()
+        date_to = vn_now()
         date_from = date_to - timedelta(days=days_back)
 
         date_from_str = date_from.strftime('%Y-%m-%d')
@@ -135,21 +429,22 @@ class HistoricalDataCollector:
         companies = ['sjc']  # DOJI and PNJ removed
         all_data = {company: [] for company in companies}
 
-        # Query once per company for the entire date range
+        # Query once per company for the entire date range, all companies concurrently
         for company in companies:
             print(f"Fetching {company.upper()} data...")
 
-            # Single query for entire date range
-            data = self.fetch_company_data(company, date_from_str, date_to_str)
+        responses = self._fetch_all(
+            lambda company: self.fetch_company_data(company, date_from_str, date_to_str),
+            companies
+        )
 
+        for company in companies:
+            data = responses[company]
             if data and 'results' in data and len(data['results']) > 0:
                 all_data[company] = data['results']
-                print(f"  [+] Collected {len(data['results'])} records")
+                print(f"  [+] {company.upper()}: collected {len(data['results'])} records")
             else:
-                print(f"  [-] No data returned")
-
-            # Small delay between companies
-            time.sleep(0.5)
+                print(f"  [-] {company.upper()}: no data returned")
 
         # Summary
         print("\n" + "=" * 60)
@@ -160,454 +455,294 @@ class HistoricalDataCollector:
 
         return all_data
     
-    def save_to_csv(self, data: Dict[str, List[Dict]], filename: Optional[str] = None):
+    def _fmt_ts(self, unix_timestamp: int) -> Optional[str]:
+        """
+        Format a Unix timestamp as 'YYYY-MM-DD HH:MM:SS' in Vietnam time, memoized per timestamp
+
+        Returns:
+            The formatted string, or None for data older than 2024
+        """
+        # Skip old data (before 2024) with an int compare, before any datetime work
+        if unix_timestamp < self._CUTOFF_TS:
+            return None
+
+        try:
+            return self._ts_cache[unix_timestamp]
+        except KeyError:
+            pass
+
+        timestamp = datetime.fromtimestamp(unix_timestamp, tz=VN_TZ).strftime('%Y-%m-%d %H:%M:%S')
+
+        if len(self._ts_cache) >= self.TS_CACHE_SIZE:
+            self._ts_cache.clear()
+        self._ts_cache[unix_timestamp] = timestamp
+        return timestamp
+
+    def _record_timestamp(self, record: Dict) -> Optional[str]:
+        """
+        Timestamp string for an API record
+
+        Returns:
+            'YYYY-MM-DD HH:MM:SS', or None if the record is older than 2024 and should be skipped
+        """
+        # API provides Unix timestamp in 'datetime' field
+        if 'datetime' in record:
+            try:
+                return self._fmt_ts(int(record['datetime']))
+            except (ValueError, TypeError):
+                pass
+        return datetime.now(VN_TZ).strftime('%Y-%m-%d %H:%M:%S')
+
+    def _emit_rows(self, company: str, records: List[Dict]) -> Iterator[tuple]:
+        """
+        Yield CSV rows (in CSV_FIELDS order) for one company's API records:
+        one row per product that has a buy or sell price
+        """
+        # Per-company constants are resolved once, not once per record
+        company_name = company.upper()
+        products = self.SCHEMA.get(company, ())
+        if not products:
+            return
+
+        record_timestamp = self._record_timestamp
+        for record in records:
+            timestamp = record_timestamp(record)
+            if timestamp is None:
+                continue
+            get = record.get
+            for gold_type, buy_key, sell_key, location in products:
+                buy_price = get(buy_key)
+                sell_price = get(sell_key)
+                if buy_price or sell_price:
+                    yield (timestamp, company_name, gold_type, buy_price, sell_price, location)
+
+    def _iter_rows(self, data: Dict[str, List[Dict]]) -> Iterator[tuple]:
+        """Turn API records (keyed by company) into CSV rows for all gold types"""
+        for company, records in data.items():
+            yield from self._emit_rows(company, records)
+    
+    def save_to_csv(self, data: Dict[str, List[Dict]], filename: Optional[str] = None,
+                    chunk_rows: int = 10000):
         """
         Save collected data to CSV file
         
         Args:
             data: Dictionary with company data
             filename: Optional custom filename (default: historical_gold_prices.csv)
+            chunk_rows: Rows written between flushes to disk
         """
         if filename is None:
             filename = os.path.join(self.DATA_DIR, 'historical_gold_prices.csv')
         
-        # Prepare rows for CSV
-        rows = []
-        
-        for company, records in data.items():
-            for record in records:
-                # Extract timestamp from API response
-                # API provides Unix timestamp in 'datetime' field
-                if 'datetime' in record:
-                    try:
-                        unix_timestamp = int(record['datetime'])
-                        timestamp_dt = datetime.fromtimestamp(unix_timestamp)
-                        timestamp = timestamp_dt.strftime('%Y-%m-%d %H:%M:%S')
-
-                        # Skip old data (before 2024)
-                        if timestamp_dt.year < 2024:
-                            continue
-                    except (ValueError, TypeError):
-                        timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-                else:
-                    timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-
-                # Create a row with all available price types
-                if company == 'sjc':
-                    # SJC has 7 gold types - save ALL of them
-
-                    # 1. SJC 1L (1 Lượng)
-                    if record.get('buy_1l') or record.get('sell_1l'):
-                        rows.append({
-                            'timestamp': timestamp,
-                            'company': 'SJC',
-                            'gold_type': 'SJC 1L',
-                            'buy_price': record.get('buy_1l'),
-                            'sell_price': record.get('sell_1l'),
-                            'location': 'National'
-                        })
-
-                    # SJC 5C and 1C removed per user request
-
-                    # 2. SJC Ring 1C (Nhẫn 1 Chỉ)
-                    if record.get('buy_nhan1c') or record.get('sell_nhan1c'):
-                        rows.append({
-                            'timestamp': timestamp,
-                            'company': 'SJC',
-                            'gold_type': 'SJC Ring 1C',
-                            'buy_price': record.get('buy_nhan1c'),
-                            'sell_price': record.get('sell_nhan1c'),
-                            'location': 'National'
-                        })
-
-                    # 3. SJC Jewelry 24K (Nữ Trang 9999)
-                    if record.get('buy_nutrang_9999') or record.get('sell_nutrang_9999'):
-                        rows.append({
-                            'timestamp': timestamp,
-                            'company': 'SJC',
-                            'gold_type': 'SJC Jewelry 24K',
-                            'buy_price': record.get('buy_nutrang_9999'),
-                            'sell_price': record.get('sell_nutrang_9999'),
-                            'location': 'National'
-                        })
-
-                    # 4. SJC Jewelry 99% (Nữ Trang 99)
-                    if record.get('buy_nutrang_99') or record.get('sell_nutrang_99'):
-                        rows.append({
-                            'timestamp': timestamp,
-                            'company': 'SJC',
-                            'gold_type': 'SJC Jewelry 99%',
-                            'buy_price': record.get('buy_nutrang_99'),
-                            'sell_price': record.get('sell_nutrang_99'),
-                            'location': 'National'
-                        })
-
-                    # 5. SJC Jewelry 18K (Nữ Trang 75)
-                    if record.get('buy_nutrang_75') or record.get('sell_nutrang_75'):
-                        rows.append({
-                            'timestamp': timestamp,
-                            'company': 'SJC',
-                            'gold_type': 'SJC Jewelry 18K',
-                            'buy_price': record.get('buy_nutrang_75'),
-                            'sell_price': record.get('sell_nutrang_75'),
-                            'location': 'National'
-                        })
-                
-                elif company == 'doji':
-                    # DOJI has 4 locations - save ALL of them
-
-                    # 1. Ho Chi Minh City
-                    if record.get('buy_hcm') or record.get('sell_hcm'):
-                        rows.append({
-                            'timestamp': timestamp,
-                            'company': 'DOJI',
-                            'gold_type': 'Gold Bar',
-                            'buy_price': record.get('buy_hcm'),
-                            'sell_price': record.get('sell_hcm'),
-                            'location': 'Ho Chi Minh City'
-                        })
-
-                    # 2. Hanoi
-                    if record.get('buy_hn') or record.get('sell_hn'):
-                        rows.append({
-                            'timestamp': timestamp,
-                            'company': 'DOJI',
-                            'gold_type': 'Gold Bar',
-                            'buy_price': record.get('buy_hn'),
-                            'sell_price': record.get('sell_hn'),
-                            'location': 'Hanoi'
-                        })
-
-                    # 3. Can Tho
-                    if record.get('buy_ct') or record.get('sell_ct'):
-                        rows.append({
-                            'timestamp': timestamp,
-                            'company': 'DOJI',
-                            'gold_type': 'Gold Bar',
-                            'buy_price': record.get('buy_ct'),
-                            'sell_price': record.get('sell_ct'),
-                            'location': 'Can Tho'
-                        })
-
-                    # 4. Da Nang
-                    if record.get('buy_dn') or record.get('sell_dn'):
-                        rows.append({
-                            'timestamp': timestamp,
-                            'company': 'DOJI',
-                            'gold_type': 'Gold Bar',
-                            'buy_price': record.get('buy_dn'),
-                            'sell_price': record.get('sell_dn'),
-                            'location': 'Da Nang'
-                        })
-                
-                elif company == 'pnj':
-                    # PNJ has 5 jewelry types - save ALL of them
-
-                    # 1. PNJ 24K Ring (Nhẫn 24K)
-                    if record.get('buy_nhan_24k') or record.get('sell_nhan_24k'):
-                        rows.append({
-                            'timestamp': timestamp,
-                            'company': 'PNJ',
-                            'gold_type': 'PNJ 24K Ring',
-                            'buy_price': record.get('buy_nhan_24k'),
-                            'sell_price': record.get('sell_nhan_24k'),
-                            'location': 'National'
-                        })
-
-                    # 2. PNJ 24K Jewelry (Nữ Trang 24K)
-                    if record.get('buy_nt_24k') or record.get('sell_nt_24k'):
-                        rows.append({
-                            'timestamp': timestamp,
-                            'company': 'PNJ',
-                            'gold_type': 'PNJ 24K Jewelry',
-                            'buy_price': record.get('buy_nt_24k'),
-                            'sell_price': record.get('sell_nt_24k'),
-                            'location': 'National'
-                        })
-
-                    # 3. PNJ 18K Jewelry (Nữ Trang 18K)
-                    if record.get('buy_nt_18k') or record.get('sell_nt_18k'):
-                        rows.append({
-                            'timestamp': timestamp,
-                            'company': 'PNJ',
-                            'gold_type': 'PNJ 18K Jewelry',
-                            'buy_price': record.get('buy_nt_18k'),
-                            'sell_price': record.get('sell_nt_18k'),
-                            'location': 'National'
-                        })
-
-                    # 4. PNJ 14K Jewelry (Nữ Trang 14K)
-                    if record.get('buy_nt_14k') or record.get('sell_nt_14k'):
-                        rows.append({
-                            'timestamp': timestamp,
-                            'company': 'PNJ',
-                            'gold_type': 'PNJ 14K Jewelry',
-                            'buy_price': record.get('buy_nt_14k'),
-                            'sell_price': record.get('sell_nt_14k'),
-                            'location': 'National'
-                        })
-
-                    # 5. PNJ 10K Jewelry (Nữ Trang 10K)
-                    if record.get('buy_nt_10k') or record.get('sell_nt_10k'):
-                        rows.append({
-                            'timestamp': timestamp,
-                            'company': 'PNJ',
-                            'gold_type': 'PNJ 10K Jewelry',
-                            'buy_price': record.get('buy_nt_10k'),
-                            'sell_price': record.get('sell_nt_10k'),
-                            'location': 'National'
-                        })
+        # Rows are generated lazily and streamed straight into the writer
+        rows = self._iter_rows(data)
+        first_row = next(rows, None)
         
         # Write to CSV
-        if rows:
-            fieldnames = ['timestamp', 'company', 'gold_type', 'buy_price', 'sell_price', 'location']
-            
-            with open(filename, 'w', newline='', encoding='utf-8') as csvfile:
-                writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-                writer.writeheader()
-                writer.writerows(rows)
+        if first_row is not None:
+            total = 0
+            rows = itertools.chain([first_row], rows)
+            with self._write_lock:
+                with self._open_csv(filename, 'w') as csvfile:
+                    writer = csv.writer(csvfile)
+                    writer.writerow(self.CSV_FIELDS)
+                    # Flush every chunk so a failure part-way keeps what was written
+                    while True:
+                        chunk = list(itertools.islice(rows, chunk_rows))
+                        if not chunk:
+                            break
+                        writer.writerows(chunk)
+                        csvfile.flush()
+                        total += len(chunk)
+
+                with self._dates_lock:
+                    if self._dates_cache_file == os.path.abspath(filename):
+                        self._dates_cache = self._dates_cache_file = self._dates_cache_stat = None
+                        self._dates_cache_rows = None
             
             print(f"\n[+] Data saved to {filename}")
-            print(f"  Total records: {len(rows)}")
+            print(f"  Total records: {total}")
         else:
             print("\n[-] No data to save")
     
-    def append_to_csv(self, data: Dict[str, List[Dict]], filename: Optional[str] = None):
+    def append_to_csv(self, data: Dict[str, List[Dict]], filename: Optional[str] = None) -> AppendResult:
         """
         Append new data to existing CSV file
 
         Args:
             data: Dictionary with company data
             filename: Optional custom filename
+
+        Returns:
+            AppendResult with the existing, added and replaced row counts
         """
         if filename is None:
             filename = os.path.join(self.DATA_DIR, 'historical_gold_prices.csv')
 
         # Prepare rows for CSV (same logic as save_to_csv - ALL gold types)
-        rows = []
+        rows = self._iter_rows(data)
+        first_row = next(rows, None)
 
-        for company, records in data.items():
-            for record in records:
-                # Extract timestamp from API response
-                if 'datetime' in record:
-                    try:
-                        unix_timestamp = int(record['datetime'])
-                        timestamp_dt = datetime.fromtimestamp(unix_timestamp)
-                        timestamp = timestamp_dt.strftime('%Y-%m-%d %H:%M:%S')
-
-                        # Skip old data (before 2024)
-                        if timestamp_dt.year < 2024:
-                            continue
-                    except (ValueError, TypeError):
-                        timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-                else:
-                    timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-
-                # Create rows based on company type
-                if company == 'sjc':
-                    # 1. SJC 1L (1 Lượng)
-                    if record.get('buy_1l') or record.get('sell_1l'):
-                        rows.append({
-                            'timestamp': timestamp,
-                            'company': 'SJC',
-                            'gold_type': 'SJC 1L',
-                            'buy_price': record.get('buy_1l'),
-                            'sell_price': record.get('sell_1l'),
-                            'location': 'National'
-                        })
-
-                    # 2. SJC Ring 1C (Nhẫn 1 Chỉ)
-                    if record.get('buy_nhan1c') or record.get('sell_nhan1c'):
-                        rows.append({
-                            'timestamp': timestamp,
-                            'company': 'SJC',
-                            'gold_type': 'SJC Ring 1C',
-                            'buy_price': record.get('buy_nhan1c'),
-                            'sell_price': record.get('sell_nhan1c'),
-                            'location': 'National'
-                        })
-
-                    # 3. SJC Jewelry 24K (Nữ Trang 9999)
-                    if record.get('buy_nutrang_9999') or record.get('sell_nutrang_9999'):
-                        rows.append({
-                            'timestamp': timestamp,
-                            'company': 'SJC',
-                            'gold_type': 'SJC Jewelry 24K',
-                            'buy_price': record.get('buy_nutrang_9999'),
-                            'sell_price': record.get('sell_nutrang_9999'),
-                            'location': 'National'
-                        })
-
-                    # 4. SJC Jewelry 99% (Nữ Trang 99)
-                    if record.get('buy_nutrang_99') or record.get('sell_nutrang_99'):
-                        rows.append({
-                            'timestamp': timestamp,
-                            'company': 'SJC',
-                            'gold_type': 'SJC Jewelry 99%',
-                            'buy_price': record.get('buy_nutrang_99'),
-                            'sell_price': record.get('sell_nutrang_99'),
-                            'location': 'National'
-                        })
-
-                    # 5. SJC Jewelry 18K (Nữ Trang 75)
-                    if record.get('buy_nutrang_75') or record.get('sell_nutrang_75'):
-                        rows.append({
-                            'timestamp': timestamp,
-                            'company': 'SJC',
-                            'gold_type': 'SJC Jewelry 18K',
-                            'buy_price': record.get('buy_nutrang_75'),
-                            'sell_price': record.get('sell_nutrang_75'),
-                            'location': 'National'
-                        })
-
-                elif company == 'doji':
-                    # DOJI has 4 locations - save ALL of them
-
-                    # 1. Ho Chi Minh City
-                    if record.get('buy_hcm') or record.get('sell_hcm'):
-                        rows.append({
-                            'timestamp': timestamp,
-                            'company': 'DOJI',
-                            'gold_type': 'Gold Bar',
-                            'buy_price': record.get('buy_hcm'),
-                            'sell_price': record.get('sell_hcm'),
-                            'location': 'Ho Chi Minh City'
-                        })
-
-                    # 2. Hanoi
-                    if record.get('buy_hn') or record.get('sell_hn'):
-                        rows.append({
-                            'timestamp': timestamp,
-                            'company': 'DOJI',
-                            'gold_type': 'Gold Bar',
-                            'buy_price': record.get('buy_hn'),
-                            'sell_price': record.get('sell_hn'),
-                            'location': 'Hanoi'
-                        })
-
-                    # 3. Can Tho
-                    if record.get('buy_ct') or record.get('sell_ct'):
-                        rows.append({
-                            'timestamp': timestamp,
-                            'company': 'DOJI',
-                            'gold_type': 'Gold Bar',
-                            'buy_price': record.get('buy_ct'),
-                            'sell_price': record.get('sell_ct'),
-                            'location': 'Can Tho'
-                        })
-
-                    # 4. Da Nang
-                    if record.get('buy_dn') or record.get('sell_dn'):
-                        rows.append({
-                            'timestamp': timestamp,
-                            'company': 'DOJI',
-                            'gold_type': 'Gold Bar',
-                            'buy_price': record.get('buy_dn'),
-                            'sell_price': record.get('sell_dn'),
-                            'location': 'Da Nang'
-                        })
-
-                elif company == 'pnj':
-                    # PNJ has 5 jewelry types - save ALL of them
-
-                    # 1. PNJ 24K Ring (Nhẫn 24K)
-                    if record.get('buy_nhan_24k') or record.get('sell_nhan_24k'):
-                        rows.append({
-                            'timestamp': timestamp,
-                            'company': 'PNJ',
-                            'gold_type': 'PNJ 24K Ring',
-                            'buy_price': record.get('buy_nhan_24k'),
-                            'sell_price': record.get('sell_nhan_24k'),
-                            'location': 'National'
-                        })
-
-                    # 2. PNJ 24K Jewelry (Nữ Trang 24K)
-                    if record.get('buy_nt_24k') or record.get('sell_nt_24k'):
-                        rows.append({
-                            'timestamp': timestamp,
-                            'company': 'PNJ',
-                            'gold_type': 'PNJ 24K Jewelry',
-                            'buy_price': record.get('buy_nt_24k'),
-                            'sell_price': record.get('sell_nt_24k'),
-                            'location': 'National'
-                        })
-
-                    # 3. PNJ 18K Jewelry (Nữ Trang 18K)
-                    if record.get('buy_nt_18k') or record.get('sell_nt_18k'):
-                        rows.append({
-                            'timestamp': timestamp,
-                            'company': 'PNJ',
-                            'gold_type': 'PNJ 18K Jewelry',
-                            'buy_price': record.get('buy_nt_18k'),
-                            'sell_price': record.get('sell_nt_18k'),
-                            'location': 'National'
-                        })
-
-                    # 4. PNJ 14K Jewelry (Nữ Trang 14K)
-                    if record.get('buy_nt_14k') or record.get('sell_nt_14k'):
-                        rows.append({
-                            'timestamp': timestamp,
-                            'company': 'PNJ',
-                            'gold_type': 'PNJ 14K Jewelry',
-                            'buy_price': record.get('buy_nt_14k'),
-                            'sell_price': record.get('sell_nt_14k'),
-                            'location': 'National'
-                        })
-
-                    # 5. PNJ 10K Jewelry (Nữ Trang 10K)
-                    if record.get('buy_nt_10k') or record.get('sell_nt_10k'):
-                        rows.append({
-                            'timestamp': timestamp,
-                            'company': 'PNJ',
-                            'gold_type': 'PNJ 10K Jewelry',
-                            'buy_price': record.get('buy_nt_10k'),
-                            'sell_price': record.get('sell_nt_10k'),
-                            'location': 'National'
-                        })
+        # Nothing new: don't read the existing file at all
+        if first_row is None:
+            print("\n[-] No data to append")
+            return AppendResult()
 
         # Check for duplicates before appending
-        if rows:
-            existing_data = self.load_csv_data(filename)
-
-            existing_map = {}
-            for row in existing_data:
-                key = self._build_row_key(row)
-                if key in existing_map:
-                    current_ts = existing_map[key].get('timestamp', '')
-                    row_ts = row.get('timestamp', '')
-                    if row_ts > current_ts:
-                        existing_map[key] = row
-                else:
-                    existing_map[key] = row
-
-            replacements = 0
-            additions = 0
-
-            for row in rows:
-                key = self._build_row_key(row)
-                if key in existing_map:
-                    replacements += 1
-                else:
-                    additions += 1
+        if not os.path.exists(filename):
+            print(f"File {filename} does not exist")
+
+        # Key every incoming row once and stash its date next to it; both are
+        # reused by the merge. The sort is stable, so rows of the same date
+        # keep their API order
+        build_key = self._build_row_key
+        incoming = []
+        for row in itertools.chain([first_row], rows):
+            key = build_key(row)
+            incoming.append((key[0], key, row))
+        incoming.sort(key=itemgetter(0))
+
+        with self._write_lock:
+            stat_before = self._file_stat(filename)
+            try:
+                result, added_dates = self._merge_sorted_csv(filename, incoming)
+            except _UnsortedCSVError:
+                # Existing file isn't in date order: merge it all in memory instead
+                result, added_dates = self._merge_csv_in_memory(filename, incoming)
+
+            if result.added or result.duplicates:
+                # Appends never drop a date, so the cached set only grows. It is
+                # only patched if it matched the file this merge started from
+                with self._dates_lock:
+                    if self._dates_cache is not None and self._dates_cache_file == os.path.abspath(filename):
+                        if self._dates_cache_stat == stat_before:
+                            added_dates.discard('')
+                            self._dates_cache.update(added_dates)
+                            self._dates_cache_stat = self._file_stat(filename)
+                            self._dates_cache_rows = result.total
+                        else:
+                            self._dates_cache = self._dates_cache_file = self._dates_cache_stat = None
+                            self._dates_cache_rows = None
+
+        if result.added or result.duplicates:
+            print(f"\n[+] Data saved to {filename}")
+            print(f"  Records replaced: {result.duplicates}")
+            print(f"  New records added: {result.added}")
+        else:
+            print("\n[-] No data changes detected")
+
+        return result
+
+    def _merge_sorted_csv(self, filename: str, incoming: List[tuple]) -> Tuple[AppendResult, Set[str]]:
+        """
+        Merge date-ordered (date, key, row) triples into a CSV sorted by timestamp, one
+        day at a time, streaming the result to a temp file that replaces the
+        original only if something changed
+
+        Raises:
+            _UnsortedCSVError: if the existing file turns out not to be in date order
+        """
+        counts = AppendResult()
+        added_dates = set()
+        written = 0
+        build_key = self._build_row_key
+
+        def existing_rows():
+            last_date = ''
+            for row in self._read_csv_rows(filename):
+                key = build_key(row)
+                if key[0] < last_date:
+                    raise _UnsortedCSVError(filename)
+                last_date = key[0]
+                counts.existing += 1
+                yield last_date, key, False, row
+
+        # heapq.merge is stable: for each date the existing rows come out
+        # before the incoming ones, which is what the dedup below relies on
+        merged = heapq.merge(existing_rows(),
+                             ((date, key, True, row) for date, key, row in incoming),
+                             key=itemgetter(0))
+
+        # A unique name, so concurrent appends never write the same temp file
+        tmp_path = _temp_path_beside(filename)
+        try:
+            with self._open_csv(tmp_path, 'w') as csvfile:
+                writer = csv.writer(csvfile)
+                writer.writerow(self.CSV_FIELDS)
+
+                for date, group in itertools.groupby(merged, key=itemgetter(0)):
+                    day = {}
+                    new = {}
+                    new_count = 0
+                    for _, key, is_new, row in group:
+                        if is_new:
+                            new[key] = row
+                            new_count += 1
+                        else:
+                            # Among existing rows with the same key the later timestamp wins
+                            current = day.get(key)
+                            if current is None or (row[0] or '') > (current[0] or ''):
+                                day[key] = row
+
+                    # Incoming rows always win; only keys the day lacks count as added
+                    added = len(new.keys() - day.keys())
+                    if added:
+                        added_dates.add(date)
+                    counts.added += added
+                    counts.duplicates += new_count - added
+                    day.update(new)
+                    written += len(day)
+                    writer.writerows(sorted(day.values(), key=itemgetter(0)))
+
+            # Duplicate keys already in the file collapse in the rewrite, so
+            # the new total is what was written, not existing + added
+            counts.total = written if counts.added or counts.duplicates else counts.existing
+            if counts.added or counts.duplicates:
+                if os.path.exists(filename):
+                    shutil.copymode(filename, tmp_path)
+                os.replace(tmp_path, filename)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+        return counts, added_dates
+
+    def _merge_csv_in_memory(self, filename: str, incoming: List[tuple]) -> Tuple[AppendResult, Set[str]]:
+        """
+        Merge (date, key, row) triples into a CSV in any order by loading all of its
+        rows into a dedup map, then rewriting it sorted by timestamp
+        """
+        # Among existing rows with the same key the later timestamp wins
+        build_key = self._build_row_key
+        existing_map = {}
+        existing_count = 0
+        for row in self._read_csv_rows(filename):
+            existing_count += 1
+            key = build_key(row)
+            current = existing_map.get(key)
+            if current is None or (row[0] or '') > (current[0] or ''):
                 existing_map[key] = row
 
-            if replacements or additions:
-                updated_rows = list(existing_map.values())
-                updated_rows.sort(key=lambda r: r.get('timestamp', ''))
+        # Incoming rows always win (the last one per key); one set difference
+        # finds the keys that are new to the file
+        incoming_map = {key: row for _, key, row in incoming}
+        added_keys = incoming_map.keys() - existing_map.keys()
+        additions = len(added_keys)
+        replacements = len(incoming) - additions
+        added_dates = {key[0] for key in added_keys}
+        existing_map.update(incoming_map)
 
-                fieldnames = ['timestamp', 'company', 'gold_type', 'buy_price', 'sell_price', 'location']
-                with open(filename, 'w', newline='', encoding='utf-8') as csvfile:
-                    writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-                    writer.writeheader()
-                    writer.writerows(updated_rows)
+        if replacements or additions:
+            updated_rows = sorted(existing_map.values(), key=itemgetter(0))
 
-                print(f"\n[+] Data saved to {filename}")
-                print(f"  Records replaced: {replacements}")
-                print(f"  New records added: {additions}")
-            else:
-                print("\n[-] No data changes detected")
-        else:
-            print("\n[-] No data to append")
+            with self._open_csv(filename, 'w') as csvfile:
+                writer = csv.writer(csvfile)
+                writer.writerow(self.CSV_FIELDS)
+                writer.writerows(updated_rows)
+
+        total = len(existing_map) if replacements or additions else existing_count
+        return AppendResult(existing=existing_count, added=additions, duplicates=replacements,
+                            total=total), added_dates
 
     def update_csv_with_latest(self, filename: Optional[str] = None):
         """
@@ -636,20 +771,22 @@ class HistoricalDataCollector:
             return None
 
         try:
-            rows = self.load_csv_data(filename)
-            if not rows:
-                return None
+            # Files written by append_to_csv are sorted: only the tail is needed.
+            # A restored or hand-edited file may not be, so the tail is only
+            # trusted if no date in the file (cached per mtime and size) is later
+            latest_date = self._sorted_tail_date(filename)
+            if latest_date is not None:
+                dates = self.get_csv_dates(filename)
+                if not dates or max(dates) <= latest_date.strftime('%Y-%m-%d'):
+                    return latest_date
+                latest_date = None
 
             # Find the most recent timestamp
-            latest_date = None
-            for row in rows:
+            for row in self._read_csv_rows(filename):
                 try:
-                    timestamp_str = row.get('timestamp', '')
-                    # Parse timestamp (format: YYYY-MM-DD HH:MM:SS or YYYY-MM-DD)
-                    if ' ' in timestamp_str:
-                        row_date = datetime.strptime(timestamp_str, '%Y-%m-%d %H:%M:%S')
-                    else:
-                        row_date = datetime.strptime(timestamp_str, '%Y-%m-%d')
+                    # Parse timestamp (format: YYYY-MM-DD HH:MM:SS or YYYY-MM-DD);
+                    # fromisoformat is C code, unlike strptime's Python format parser
+                    row_date = datetime.fromisoformat(row[0])
 
                     if latest_date is None or row_date > latest_date:
                         latest_date = row_date
@@ -661,7 +798,44 @@ class HistoricalDataCollector:
             print(f"Error getting last CSV date: {e}")
             return None
 
-    def fetch_missing_data(self, filename: Optional[str] = None) -> Dict[str, int]:
+    def _sorted_tail_date(self, filename: str) -> Optional[datetime]:
+        """
+        Latest timestamp of a CSV sorted by timestamp, read from the last
+        TAIL_BYTES of the file
+
+        Returns:
+            The last timestamp, or None if the file is small, not in the standard
+            column order, or doesn't look sorted (caller then scans it fully)
+        """
+        with open(filename, 'rb') as f:
+            size = f.seek(0, os.SEEK_END)
+            if size <= self.TAIL_BYTES:
+                return None
+
+            f.seek(0)
+            if not f.readline().startswith(b'timestamp,'):
+                return None
+            first_line = f.readline()
+
+            f.seek(size - self.TAIL_BYTES)
+            # The first line of the tail is usually cut off part-way
+            tail = f.read().splitlines()[1:]
+
+        try:
+            first_date = datetime.fromisoformat(first_line.split(b',', 1)[0].decode('utf-8'))
+            dates = [datetime.fromisoformat(line.split(b',', 1)[0].decode('utf-8'))
+                     for line in tail if line.strip()]
+        except (ValueError, UnicodeDecodeError):
+            return None
+
+        # Sorted file: the first row is no later than the tail, which ascends
+        if not dates or first_date > dates[0]:
+            return None
+        if any(earlier > later for earlier, later in zip(dates, dates[1:])):
+            return None
+        return dates[-1]
+
+    def fetch_missing_data(self, filename: Optional[str] = None, force: bool = False) -> Dict[str, int]:
         """
         Fetch and append missing data from the last CSV date to today
         
@@ -669,6 +843,10 @@ class HistoricalDataCollector:
         not just the missing dates. This method will fetch a broader range and merge
         it with existing data to fill gaps.
 
+        Args:
+            filename: Optional custom filename
+            force: Query the API even on a Sunday when only Sunday is missing
+
         Returns:
             Dictionary with statistics about the update
         """
@@ -690,7 +868,7 @@ class HistoricalDataCollector:
             }
 
         # Calculate days between last date and today
-        today = datetime.now()
+        today = vn_now()
         days_missing = (today - last_date).days
 
         if days_missing <= 0:
@@ -715,47 +893,55 @@ class HistoricalDataCollector:
         elif days_missing == 1 and today.hour < 11:
             print(f"Note: Today's data may not be available yet (published around 10:00 AM Vietnam time)")
 
-        # Fetch data from a broader range to catch any gaps in the middle
-        # Use the last 30 days or days since last update, whichever is larger
+        # Look for gaps over the last 30 days or days since last update, whichever is larger
         days_to_fetch = max(30, days_missing + 5)  # Add 5 extra days as buffer
-        date_from = today - timedelta(days=days_to_fetch)
+        date_from = self._gap_window_start(filename, today, days_to_fetch, last_date)
         
         date_from_str = date_from.strftime('%Y-%m-%d')
         date_to = today.strftime('%Y-%m-%d')
 
-        print(f"Fetching data from {date_from_str} to {date_to} (last {days_to_fetch} days)...")
+        # Sunday with Saturday already in the CSV: the market is closed, so the
+        # API has nothing new - skip the request
+        if is_sunday and not force and last_date.date() >= (today - timedelta(days=1)).date():
+            print("Skipping API request (no trading on Sundays)")
+            return {
+                'status': 'no_data',
+                'message': 'No data available from API (the gold market is typically closed on Sundays)',
+                'days_requested': days_missing,
+                'records_added': 0,
+                'date_from': date_from_str,
+                'date_to': date_to
+            }
+
+        print(f"Fetching data from {date_from_str} to {date_to} (gaps checked over the last {days_to_fetch} days)...")
         print(f"Note: This will fill any gaps in existing data, not just append to the end")
 
         missing_data = {}
         companies = ['sjc']  # DOJI and PNJ removed
 
+        # All companies are requested concurrently; the rate limiter paces them
         for company in companies:
             print(f"  Fetching {company.upper()}...")
-            company_data = self.fetch_company_data(company, date_from_str, date_to)
 
+        responses = self._fetch_all(
+            lambda company: self.fetch_company_data(company, date_from_str, date_to),
+            companies
+        )
+
+        for company in companies:
+            company_data = responses[company]
             if company_data and 'results' in company_data:
                 missing_data[company] = company_data['results']
-                print(f"    [+] Got {len(company_data['results'])} records from API")
+                print(f"    [+] {company.upper()}: got {len(company_data['results'])} records from API")
             else:
-                print(f"    [-] No data available")
-
-            time.sleep(1)  # Rate limiting
+                print(f"    [-] {company.upper()}: no data available")
 
         # Append missing data to CSV (use append_to_csv which handles deduplication)
         total_records = sum(len(records) for records in missing_data.values()) if missing_data else 0
 
         if total_records > 0:
-            # Count existing records before update
-            existing_data = self.load_csv_data(filename)
-            existing_count = len(existing_data)
-            
-            self.append_to_csv(missing_data, filename)
-            
-            # Count records after update
-            updated_data = self.load_csv_data(filename)
-            updated_count = len(updated_data)
-            
-            actual_added = updated_count - existing_count
+            # append_to_csv reports what it added; no need to reload the CSV
+            actual_added = self.append_to_csv(missing_data, filename).added
 
             return {
                 'status': 'updated',
@@ -784,16 +970,65 @@ class HistoricalDataCollector:
                 'date_to': date_to
             }
     
+    def _gap_window_start(self, filename: str, today: datetime, days_back: int,
+                          last_date: datetime) -> datetime:
+        """
+        Start of the smallest date window ending today that covers every
+        missing date of the last days_back days, so fetch_missing_data doesn't
+        re-download days the CSV already has
+
+        Sundays are not counted as missing (the market is closed). The last CSV
+        date is always included, since later updates for that day may exist.
+        """
+        existing_dates = self.get_csv_dates(filename)
+        start = min(today, last_date)
+
+        for offset in range(days_back, 0, -1):
+            day = today - timedelta(days=offset)
+            if day.weekday() != 6 and day.strftime('%Y-%m-%d') not in existing_dates:
+                # Oldest gap found: everything after it is fetched anyway
+                return min(day, start)
+        return start
+
     @staticmethod
-    def _build_row_key(row: Dict) -> tuple:
-        timestamp = row.get('timestamp', '') or ''
-        date_part = timestamp.split(' ')[0]
-        return (
-            date_part,
-            row.get('company', '') or '',
-            row.get('gold_type', '') or '',
-            row.get('location', '') or ''
-        )
+    def _build_row_key(row: tuple) -> tuple:
+        """Dedup key of a CSV row tuple: one row per day, company, gold type and location"""
+        # Timestamps are fixed-width 'YYYY-MM-DD HH:MM:SS': the date is the first 10 chars
+        return ((row[0] or '')[:10], row[1] or '', row[2] or '', row[5] or '')
+
+    def _open_csv(self, filename: str, mode: str = 'r') -> TextIO:
+        """Open a CSV file for the csv module: UTF-8, newline='', large buffer"""
+        return open(filename, mode, encoding='utf-8', newline='', buffering=self.CSV_BUFFER_SIZE)
+
+    def _read_csv_rows(self, filename: str) -> Iterator[tuple]:
+        """
+        Yield the rows of a CSV file as tuples in CSV_FIELDS order (missing values as None)
+        """
+        if not os.path.exists(filename):
+            return
+
+        with self._open_csv(filename) as csvfile:
+            reader = csv.reader(csvfile)
+            header = next(reader, None)
+            if header is None:
+                return
+
+            width = len(self.CSV_FIELDS)
+            if header == self.CSV_FIELDS:
+                # company/gold_type/location repeat on every row: interning
+                # shares one string object per value across all rows
+                intern = sys.intern
+                for row in reader:
+                    if len(row) == width:
+                        yield (row[0], intern(row[1]), intern(row[2]), row[3], row[4], intern(row[5]))
+                    elif row:
+                        yield tuple(row[:width]) + (None,) * (width - len(row))
+            else:
+                # Columns in a different order: map them by name
+                columns = [header.index(field) if field in header else None for field in self.CSV_FIELDS]
+                for row in reader:
+                    if row:
+                        yield tuple(row[i] if i is not None and i < len(row) else None for i in columns)
 
     def load_csv_data(self, filename: Optional[str] = None) -> List[Dict]:
         """
@@ -801,6 +1036,9 @@ class HistoricalDataCollector:
         
         Returns:
             List of dictionaries containing price records
+
+        Raises:
+            ValueError: if the file's header isn't the standard CSV_FIELDS layout
         """
         if filename is None:
             filename = os.path.join(self.DATA_DIR, 'historical_gold_prices.csv')
@@ -809,30 +1047,188 @@ class HistoricalDataCollector:
             print(f"File {filename} does not exist")
             return []
         
-        rows = []
-        with open(filename, 'r', encoding='utf-8') as csvfile:
-            reader = csv.DictReader(csvfile)
+        with self._open_csv(filename) as csvfile:
+            reader = csv.reader(csvfile)
+            header = next(reader, None)
+            if header is None:
+                return []
+            if tuple(header) != _CSV_HEADER:
+                raise ValueError(f"Unexpected CSV header in {filename}: {header} (expected {list(_CSV_HEADER)})")
+            header = _CSV_HEADER
+            width = len(header)
+
+            rows = []
             for row in reader:
-                rows.append(row)
+                if len(row) == width:
+                    rows.append(dict(zip(header, row)))
+                elif row:
+                    # Same shape as csv.DictReader: missing values are None,
+                    # extra values are collected under the None key
+                    record = dict(zip(header, row))
+                    if len(row) < width:
+                        record.update(dict.fromkeys(header[len(row):]))
+                    else:
+                        record[None] = row[width:]
+                    rows.append(record)
         
         return rows
 
+    def iter_csv_column(self, filename: str, column: str) -> Iterator[Optional[str]]:
+        """
+        Stream one column of a CSV file, one value per data row (None where a
+        row is too short), without keeping any rows in memory
+        """
+        if not os.path.exists(filename):
+            return
+
+        with self._open_csv(filename) as csvfile:
+            reader = csv.reader(csvfile)
+            header = next(reader, None)
+            if header is None or column not in header:
+                return
+            idx = header.index(column)
+
+            for row in reader:
+                if row:
+                    yield row[idx] if len(row) > idx else None
+
+    @staticmethod
+    def _file_stat(filename: str) -> Optional[Tuple[int, int]]:
+        """(st_mtime_ns, st_size) of a file, or None if it can't be stat'ed"""
+        try:
+            stat = os.stat(filename)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    @staticmethod
+    def _load_timestamps_pandas(filename: str) -> Optional[Tuple[int, Set[str]]]:
+        """
+        Row count and date set of a CSV read with pandas, parsing only the
+        timestamp column
+
+        Returns:
+            (number of rows, set of 'YYYY-MM-DD' dates), or None if pandas isn't
+            installed or the file has no timestamp column
+        """
+        try:
+            import pandas as pd
+        except ImportError:
+            return None
+
+        try:
+            timestamps = pd.read_csv(filename, usecols=['timestamp'], dtype=str,
+                                     keep_default_na=False, engine='c')['timestamp']
+        except (ValueError, pd.errors.EmptyDataError):
+            return None
+
+        dates = set(timestamps.fillna('').str.slice(0, 10).unique())
+        dates.discard('')
+        return len(timestamps), dates
+
+    def count_rows_and_dates(self, filename: Optional[str] = None) -> Tuple[int, Set[str]]:
+        """
+        Count the data rows of a CSV file and collect its dates in one pass,
+        without building a dict per row like load_csv_data
+
+        Returns:
+            (number of rows, set of 'YYYY-MM-DD' dates)
+        """
+        if filename is None:
+            filename = os.path.join(self.DATA_DIR, 'historical_gold_prices.csv')
+
+        # Stat'ed before the scan: a write during it leaves the cache stale, not wrong
+        stat = self._file_stat(filename)
+
+        # pandas' C tokenizer wins on big files; below that its overhead doesn't pay off
+        loaded = None
+        if stat is not None and stat[1] >= self.PANDAS_MIN_BYTES:
+            loaded = self._load_timestamps_pandas(filename)
+
+        if loaded is not None:
+            count, dates = loaded
+        else:
+            count = 0
+            dates = set()
+            for timestamp in self.iter_csv_column(filename, 'timestamp'):
+                count += 1
+                if timestamp:
+                    dates.add(timestamp[:10])
+
+        # Remember the dates and count so get_csv_dates/get_csv_stats don't rescan this file
+        with self._dates_lock:
+            self._dates_cache = set(dates)
+            self._dates_cache_file = os.path.abspath(filename)
+            self._dates_cache_stat = stat
+            self._dates_cache_rows = count
+        return count, dates
+
+    def _cached_csv_stats(self, filename: str) -> Optional[Tuple[Optional[int], Set[str]]]:
+        """
+        (row count or None, copy of the dates) from the cache if it still
+        matches the file's mtime and size, else None
+        """
+        with self._dates_lock:
+            if (self._dates_cache is not None and self._dates_cache_file == os.path.abspath(filename)
+                    and self._dates_cache_stat == self._file_stat(filename)):
+                return self._dates_cache_rows, set(self._dates_cache)
+        return None
+
+    def get_csv_dates(self, filename: Optional[str] = None) -> Set[str]:
+        """
+        Dates ('YYYY-MM-DD') present in a CSV file. The file is scanned once;
+        later calls use the cached set, which append_to_csv keeps up to date,
+        as long as the file's mtime and size still match
+
+        Returns:
+            A copy of the cached set of dates
+        """
+        if filename is None:
+            filename = os.path.join(self.DATA_DIR, 'historical_gold_prices.csv')
 
-def main():
+        cached = self._cached_csv_stats(filename)
+        if cached is not None:
+            return cached[1]
+        return self.count_rows_and_dates(filename)[1]
+
+    def get_csv_stats(self, filename: Optional[str] = None) -> Tuple[int, Set[str]]:
+        """
+        Row count and dates of a CSV file, like count_rows_and_dates, but
+        reusing the scan behind an earlier get_csv_dates call when the file
+        hasn't changed since
+
+        Returns:
+            (number of rows, set of 'YYYY-MM-DD' dates)
+        """
+        if filename is None:
+            filename = os.path.join(self.DATA_DIR, 'historical_gold_prices.csv')
+
+        cached = self._cached_csv_stats(filename)
+        if cached is not None and cached[0] is not None:
+            return cached
+        return self.count_rows_and_dates(filename)
+
+
+def main(force: bool = False):
     """Main function to collect and save historical data"""
     print("=" * 60)
     print("Historical Gold Price Data Collector")
     print("=" * 60)
     
-    collector = HistoricalDataCollector()
-    
-    # Collect one year of historical data
-    print("\nCollecting historical data for the past year...")
-    data = collector.collect_historical_data(days_back=365)
-    
-    # Save to CSV
-    print("\nSaving data to CSV...")
-    collector.save_to_csv(data)
+    with HistoricalDataCollector() as collector:
+        # A CSV that already has today's data doesn't need a full rebuild
+        if not force and vn_now().strftime('%Y-%m-%d') in collector.get_csv_dates():
+            print("\n[+] CSV already has today's data - nothing to collect")
+            print("    Run with --force to rebuild it from the API")
+            return
+
+        # Collect one year of historical data
+        print("\nCollecting historical data for the past year...")
+        data = collector.collect_historical_data(days_back=365)
+        
+        # Save to CSV
+        print("\nSaving data to CSV...")
+        collector.save_to_csv(data)
     
     print("\n" + "=" * 60)
     print("Data collection complete!")
@@ -840,5 +1236,8 @@ def main():
 
 
 if __name__ == '__main__':
-    main()
+    parser = argparse.ArgumentParser(description="Collect one year of historical gold prices into CSV")
+    parser.add_argument('--force', action='store_true',
+                        help="rebuild even if the CSV already has today's data")
+    main(force=parser.parse_args().force)
 
@@ -15,24 +15,46 @@ The script will:
 2. Merge with existing CSV (avoiding duplicates)
 3. Show which dates were added
 
-Run: python fill_all_gaps.py
+Run: python fill_all_gaps.py [--force]
+     (set VERBOSE=1 to also list every fetched and existing date)
 """
 
-from data_collector import HistoricalDataCollector
-from datetime import datetime, timedelta
+import argparse
+import os
 
-def main():
+from data_collector import HistoricalDataCollector, VN_TZ, vn_now
+from datetime import date, timedelta
+
+# Full date listings are only printed (and sorted) when VERBOSE is set
+VERBOSE = bool(os.environ.get('VERBOSE'))
+
+SECONDS_PER_DAY = 86400
+EPOCH_DATE = date(1970, 1, 1)
+
+def main(force=False):
     print("=" * 60)
     print("Filling ALL Gaps in Historical Data")
     print("=" * 60)
     
     collector = HistoricalDataCollector()
+    csv_file = 'historical_data/historical_gold_prices.csv'
     
     # Fetch data for the last 30 days
     # This will cover all gaps between Oct 28 and today
-    today = datetime.now()
+    # Vietnam dates, whatever the machine's timezone; the CSV is in Vietnam time
+    today = vn_now()
     date_from = today - timedelta(days=30)
     
+    # Nothing to fill if every trading day (Sundays excluded) up to today is
+    # already in the CSV: skip the API call entirely
+    existing_dates = collector.get_csv_dates(csv_file)
+    gaps = [day for day in (today - timedelta(days=offset) for offset in range(30, -1, -1))
+            if day.weekday() != 6 and day.strftime('%Y-%m-%d') not in existing_dates]
+    if not gaps and not force:
+        print("\n[+] CSV already covers every trading day of the last 30 days")
+        print("    Run with --force to fetch anyway")
+        return
+    
     date_from_str = date_from.strftime('%Y-%m-%d')
     date_to_str = today.strftime('%Y-%m-%d')
     
@@ -50,55 +72,42 @@ def main():
         if company_data and 'results' in company_data:
             missing_data[company] = company_data['results']
             
-            # Show unique dates
-            unique_dates = set()
-            for record in company_data['results']:
-                if 'datetime' in record:
-                    timestamp = int(record['datetime'])
-                    dt = datetime.fromtimestamp(timestamp)
-                    unique_dates.add(dt.strftime('%Y-%m-%d'))
+            # Show unique dates: bucket epochs into Vietnam-time day numbers with
+            # integer math, then format one date per distinct day
+            offset = int(VN_TZ.utcoffset(None).total_seconds())
+            days = {(int(record['datetime']) + offset) // SECONDS_PER_DAY
+                    for record in company_data['results'] if 'datetime' in record}
+            unique_dates = {(EPOCH_DATE + timedelta(days=day)).isoformat() for day in days}
             
             print(f"  [+] Got {len(company_data['results'])} records from API")
             print(f"  [+] Covering {len(unique_dates)} unique dates")
-            print(f"  [+] Dates: {sorted(unique_dates)}\n")
+            if VERBOSE:
+                print(f"  [+] Dates: {sorted(unique_dates)}")
+            print()
         else:
             print(f"  [-] No data available\n")
     
     if missing_data:
-        # Count existing records
-        csv_file = 'historical_data/historical_gold_prices.csv'
-        existing_data = collector.load_csv_data(csv_file)
-        existing_count = len(existing_data)
-        
-        # Get existing unique dates
-        existing_dates = set()
-        for row in existing_data:
-            timestamp = row.get('timestamp', '')
-            if timestamp:
-                date_part = timestamp.split(' ')[0]
-                existing_dates.add(date_part)
+        # Count existing records (reuses the scan behind get_csv_dates above)
+        existing_count, existing_dates = collector.get_csv_stats(csv_file)
         
-        print(f"Existing data: {len(existing_data)} records covering {len(existing_dates)} dates")
-        print(f"Existing dates: {sorted(existing_dates)}\n")
+        print(f"Existing data: {existing_count} records covering {len(existing_dates)} dates")
+        if VERBOSE:
+            print(f"Existing dates: {sorted(existing_dates)}")
+        print()
         
         # Merge with CSV
         print("Merging with existing data...")
-        collector.append_to_csv(missing_data, csv_file)
-        
-        # Count after merge
-        updated_data = collector.load_csv_data(csv_file)
-        updated_count = len(updated_data)
+        result = collector.append_to_csv(missing_data, csv_file)
+        # Rows in the merged file: duplicate keys it had are collapsed, so
+        # this can be less than existing_count + records added
+        updated_count = result.total if result.total is not None else existing_count
         
-        # Get new unique dates
-        new_dates = set()
-        for row in updated_data:
-            timestamp = row.get('timestamp', '')
-            if timestamp:
-                date_part = timestamp.split(' ')[0]
-                new_dates.add(date_part)
+        # Dates after merge (the collector's cache, updated by append_to_csv)
+        new_dates = collector.get_csv_dates(csv_file)
         
         dates_added = new_dates - existing_dates
-        records_added = updated_count - existing_count
+        records_added = result.added
         
         print("\n" + "=" * 60)
         print("Update Complete!")
@@ -114,5 +123,8 @@ def main():
         print("\n[-] No data fetched from API")
 
 if __name__ == '__main__':
-    main()
+    parser = argparse.ArgumentParser(description="Fill gaps in the historical gold price CSV")
+    parser.add_argument('--force', action='store_true',
+                        help="fetch even if the CSV already covers the last 30 days")
+    main(force=parser.parse_args().force)
 
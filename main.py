@@ -3,16 +3,28 @@ FastAPI Backend for Gold Price Dashboard
 Modern, high-performance API with automatic documentation and WebSocket support
 """
 
-from fastapi import FastAPI, HTTPException, Query, WebSocket, WebSocketDisconnect
+from fastapi import FastAPI, HTTPException, Query, Request, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
-from pydantic import BaseModel
-from typing import Optional, List, Dict, Any
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
+from typing import Optional, List, Dict, Any, Set, Tuple
 from datetime import datetime, timedelta
-import requests
+import httpx
 import os
+import gzip
+import shutil
+import tempfile
 import asyncio
 import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+from cachetools import TTLCache
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 # Import modules
 try:
@@ -27,13 +39,20 @@ except ImportError:
     GoldPriceAnalyzer = None
     HistoricalDataCollector = None
 
+class ORJSONResponse(JSONResponse):
+    """JSON response rendered with orjson"""
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+
 # Initialize FastAPI app
 app = FastAPI(
     title="Gold Price Dashboard API",
     description="Vietnamese Gold Price Monitoring and Analytics API",
     version="2.0.0",
     docs_url="/api/docs",
-    redoc_url="/api/redoc"
+    redoc_url="/api/redoc",
+    default_response_class=ORJSONResponse if orjson is not None else JSONResponse
 )
 
 # Configure CORS
@@ -45,11 +64,18 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+def dumps_json(data: Any) -> str:
+    """Serialize data to a JSON string, using orjson when it is installed"""
+    if orjson is not None:
+        return orjson.dumps(data).decode('utf-8')
+    return json.dumps(data)
+
 # Initialize services
 class GoldPriceAPI:
     """Handle API requests to the Gold Price API"""
     
     BASE_URL = "https://vapi.vnappmob.com"
+    CACHE_TTL = 30  # seconds; upstream prices are polled every 60s
     
     def __init__(self, api_key: Optional[str] = None):
         self.api_key = api_key
@@ -58,11 +84,70 @@ class GoldPriceAPI:
         }
         if api_key:
             self.headers['Authorization'] = f'Bearer {api_key}'
-    
-    def get_company_price(self, company: str, date_from: Optional[str] = None, 
-                         date_to: Optional[str] = None) -> Optional[Dict]:
-        """Get gold price for a specific company"""
-        url = f"{self.BASE_URL}/api/v2/gold/{company.lower()}"
+        self._client: Optional[httpx.AsyncClient] = None
+        self._cache = TTLCache(maxsize=256, ttl=self.CACHE_TTL)
+        self._locks: Dict[tuple, asyncio.Lock] = {}
+        self._lock_users: Dict[tuple, int] = {}
+
+    def open(self) -> httpx.AsyncClient:
+        """Create the shared HTTP client (connection pool) if needed"""
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                base_url=self.BASE_URL,
+                headers=self.headers,
+                timeout=10.0,
+                limits=httpx.Limits(max_keepalive_connections=20)
+            )
+        return self._client
+
+    async def close(self):
+        """Close the shared HTTP client"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def invalidate(self, company: str, keep: Optional[tuple] = None):
+        """Drop all cached responses for a company, except the key given as keep"""
+        company = company.lower()
+        for key in [key for key in list(self._cache.keys()) if key[0] == company and key != keep]:
+            self._cache.pop(key, None)
+
+    async def get_company_price(self, company: str, date_from: Optional[str] = None,
+                                date_to: Optional[str] = None, refresh: bool = False) -> Optional[Dict]:
+        """
+        Get gold price for a specific company (cached for CACHE_TTL seconds)
+
+        Set refresh=True to skip the cache lookup and store a fresh response.
+        """
+        key = (company.lower(), date_from, date_to)
+        cached = None if refresh else self._cache.get(key)
+        if cached is not None:
+            return cached
+
+        # Single-flight: concurrent misses for the same key share one upstream call.
+        # The lock lives while anyone holds or waits on it, so a caller arriving
+        # just after a release still queues behind the same lock
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        self._lock_users[key] = self._lock_users.get(key, 0) + 1
+        try:
+            async with lock:
+                cached = None if refresh else self._cache.get(key)
+                if cached is not None:
+                    return cached
+
+                data = await self._fetch_company_price(company, date_from, date_to)
+                if data is not None:
+                    self._cache[key] = data
+                return data
+        finally:
+            self._lock_users[key] -= 1
+            if not self._lock_users[key]:
+                del self._lock_users[key]
+                del self._locks[key]
+
+    async def _fetch_company_price(self, company: str, date_from: Optional[str] = None,
+                                   date_to: Optional[str] = None) -> Optional[Dict]:
+        """Request gold price for a company from the upstream API"""
         params = {}
         if date_from:
             params['date_from'] = date_from
@@ -70,83 +155,215 @@ class GoldPriceAPI:
             params['date_to'] = date_to
         
         try:
-            response = requests.get(url, headers=self.headers, params=params, timeout=10)
+            response = await self.open().get(f"/api/v2/gold/{company.lower()}", params=params)
             response.raise_for_status()
             return response.json()
-        except requests.exceptions.RequestException as e:
+        except httpx.HTTPError as e:
             print(f"Error fetching {company} price: {e}")
             return None
 
 # Initialize services
 api = GoldPriceAPI(api_key=API_KEY)
 analyzer = GoldPriceAnalyzer() if GoldPriceAnalyzer else None
-collector = HistoricalDataCollector(api_key=API_KEY) if HistoricalDataCollector else None
+# One retry: the startup gap fill and API requests wait on the collector, so a
+# dead upstream should fail in well under a minute rather than several
+collector = HistoricalDataCollector(api_key=API_KEY, max_retries=1) if HistoricalDataCollector else None
+
+# Historical price CSV written by the collector
+HISTORICAL_CSV = os.path.join(
+    HistoricalDataCollector.DATA_DIR if HistoricalDataCollector else 'historical_data',
+    'historical_gold_prices.csv'
+)
+
+# Price fields compared to detect a price change
+PRICE_FIELDS = ('buy_1l', 'sell_1l', 'buy_nhan1c', 'sell_nhan1c')
 
 # WebSocket Connection Manager
 class ConnectionManager:
     """Manage WebSocket connections and broadcast messages"""
     
+    # Per-client send timeout (seconds) and outgoing queue size (messages)
+    SEND_TIMEOUT = 5.0
+    SEND_QUEUE_SIZE = 64
+    # Close codes sent to clients the server drops: a failed send, or a full
+    # send queue (the client isn't keeping up)
+    CLOSE_SEND_FAILED = 1011
+    CLOSE_QUEUE_FULL = 1008
+    # Window (seconds) for coalescing scheduled broadcasts
+    COALESCE_WINDOW = 0.1
+
     def __init__(self):
-        self.active_connections: List[WebSocket] = []
+        self.active_connections: Set[WebSocket] = set()
         self.last_prices: Optional[Dict] = None
+        self._last_fingerprint: Optional[int] = None
+        self._queues: Dict[WebSocket, asyncio.Queue] = {}
+        self._writers: Dict[WebSocket, asyncio.Task] = {}
+        self._pending: List[dict] = []
+        self._flush_task: Optional[asyncio.Task] = None
+        self._closing: Set[asyncio.Task] = set()
     
     async def connect(self, websocket: WebSocket):
         """Accept and store new WebSocket connection"""
         await websocket.accept()
-        self.active_connections.append(websocket)
+        self.active_connections.add(websocket)
+
+        # Each client gets its own bounded queue drained by a writer task, so a
+        # slow client never holds up a broadcast to the others
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.SEND_QUEUE_SIZE)
+        self._queues[websocket] = queue
+        self._writers[websocket] = asyncio.create_task(self._writer_loop(websocket, queue))
         print(f"[+] WebSocket client connected. Total connections: {len(self.active_connections)}")
     
-    def disconnect(self, websocket: WebSocket):
-        """Remove WebSocket connection from pool"""
+    def disconnect(self, websocket: WebSocket, close_code: Optional[int] = None):
+        """Remove WebSocket connection from pool, closing it with close_code if given"""
+        self._queues.pop(websocket, None)
+        writer = self._writers.pop(websocket, None)
+        if writer is not None and writer is not asyncio.current_task():
+            writer.cancel()
+
         if websocket in self.active_connections:
-            self.active_connections.remove(websocket)
+            self.active_connections.discard(websocket)
+            if close_code is not None:
+                self._schedule_close(websocket, close_code)
             print(f"[-] WebSocket client disconnected. Total connections: {len(self.active_connections)}")
-    
+
+    def _schedule_close(self, websocket: WebSocket, code: int):
+        """Close a dropped client in the background so it sees why, not a silent stall"""
+        task = asyncio.create_task(self._close(websocket, code))
+        # Hold a reference until the close finishes so the task isn't collected
+        self._closing.add(task)
+        task.add_done_callback(self._closing.discard)
+
+    async def _close(self, websocket: WebSocket, code: int):
+        """Send a close frame, ignoring clients that are already gone or stuck"""
+        try:
+            await asyncio.wait_for(websocket.close(code=code), timeout=self.SEND_TIMEOUT)
+        except Exception:
+            pass
+
+    async def _writer_loop(self, websocket: WebSocket, queue: asyncio.Queue):
+        """Send queued messages to one client until it fails or disconnects"""
+        while True:
+            message_json = await queue.get()
+            try:
+                await asyncio.wait_for(websocket.send_text(message_json), timeout=self.SEND_TIMEOUT)
+            except Exception as e:
+                print(f"Error sending to client: {e}")
+                self.disconnect(websocket, self.CLOSE_SEND_FAILED)
+                return
+
+    def _enqueue(self, websocket: WebSocket, message_json: str) -> bool:
+        """Queue a serialized message for one client; False if its queue is full"""
+        queue = self._queues.get(websocket)
+        if queue is None:
+            return True
+        try:
+            queue.put_nowait(message_json)
+            return True
+        except asyncio.QueueFull:
+            return False
+
+    def _disconnect_many(self, websockets: List[WebSocket]):
+        """Remove several connections from the pool at once"""
+        self.active_connections.difference_update(websockets)
+        for websocket in websockets:
+            self._queues.pop(websocket, None)
+            writer = self._writers.pop(websocket, None)
+            if writer is not None:
+                writer.cancel()
+            self._schedule_close(websocket, self.CLOSE_QUEUE_FULL)
+        print(f"[-] Dropped {len(websockets)} slow WebSocket client(s). Total connections: {len(self.active_connections)}")
+
+    async def send_message(self, websocket: WebSocket, message: dict):
+        """Send message to a single connected client"""
+        if not self._enqueue(websocket, dumps_json(message)):
+            print("Client send queue full - disconnecting slow client")
+            self.disconnect(websocket, self.CLOSE_QUEUE_FULL)
+
+    def schedule_broadcast(self, message: dict):
+        """Queue a message; messages queued within COALESCE_WINDOW go out as one frame"""
+        self._pending.append(message)
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush_after(self.COALESCE_WINDOW))
+
+    async def _flush_after(self, delay: float):
+        """Wait for the coalescing window, then broadcast everything queued so far"""
+        await asyncio.sleep(delay)
+        pending, self._pending = self._pending, []
+        if not pending:
+            return
+
+        if len(pending) == 1:
+            message = pending[0]
+        else:
+            # Latest message stays at the top level for existing clients
+            message = dict(pending[-1])
+            message['batch'] = pending
+        await self.broadcast(message)
+
     async def broadcast(self, message: dict):
         """Send message to all connected clients"""
         if not self.active_connections:
             return
         
-        message_json = json.dumps(message)
-        disconnected = []
-        
-        for connection in self.active_connections:
-            try:
-                await connection.send_text(message_json)
-            except Exception as e:
-                print(f"Error sending to client: {e}")
-                disconnected.append(connection)
-        
-        # Clean up disconnected clients
-        for connection in disconnected:
-            self.disconnect(connection)
+        # Serialize once and reuse the same payload for every client. Frames stay
+        # text (not bytes) because the dashboard calls JSON.parse(event.data).
+        message_json = dumps_json(message)
+
+        # Iterate a snapshot so removals can't mutate the set mid-loop, and drop
+        # backed-up clients in one batch afterwards
+        connections = tuple(self.active_connections)
+        backed_up = [connection for connection in connections
+                     if not self._enqueue(connection, message_json)]
+
+        if backed_up:
+            self._disconnect_many(backed_up)
     
+    @staticmethod
+    def _price_fingerprint(prices: Dict) -> int:
+        """Hash of the key SJC price fields of the latest record"""
+        latest = (prices.get('sjc', {}).get('results') or [{}])[0]
+        return hash(tuple(latest.get(field) for field in PRICE_FIELDS))
+
     def has_price_changed(self, new_prices: Dict) -> bool:
         """Check if prices have changed since last check"""
         if self.last_prices is None:
             self.last_prices = new_prices
+            self._last_fingerprint = self._price_fingerprint(new_prices)
+            return True
+
+        if 'sjc' not in new_prices:
+            return False
+
+        # Compare a single fingerprint instead of walking each price field
+        fingerprint = self._price_fingerprint(new_prices)
+        if fingerprint != self._last_fingerprint:
+            self.last_prices = new_prices
+            self._last_fingerprint = fingerprint
             return True
-        
-        # Compare prices
-        if 'sjc' in new_prices and 'sjc' in self.last_prices:
-            old_sjc = self.last_prices.get('sjc', {}).get('results', [{}])[0]
-            new_sjc = new_prices.get('sjc', {}).get('results', [{}])[0]
-            
-            # Check key price fields
-            changed_fields = []
-            for field in ['buy_1l', 'sell_1l', 'buy_nhan1c', 'sell_nhan1c']:
-                if old_sjc.get(field) != new_sjc.get(field):
-                    changed_fields.append(field)
-            
-            if changed_fields:
-                self.last_prices = new_prices
-                return True
         
         return False
 
 # Initialize connection manager
 manager = ConnectionManager()
 
+# Adaptive polling: poll quickly after a change, back off while prices are idle
+POLL_INTERVAL_ACTIVE = 15    # seconds, right after a detected change
+POLL_INTERVAL_BASE = 30      # seconds, grows while no change is detected
+POLL_INTERVAL_MAX = 300      # seconds
+_poll_state: Dict[str, int] = {'interval': 60, 'idle_polls': 0}
+
+def _next_poll_interval(changed: bool) -> int:
+    """Update the polling state after a poll and return the next interval"""
+    if changed:
+        _poll_state['idle_polls'] = 0
+        _poll_state['interval'] = POLL_INTERVAL_ACTIVE
+    else:
+        _poll_state['idle_polls'] += 1
+        _poll_state['interval'] = min(POLL_INTERVAL_MAX,
+                                      POLL_INTERVAL_BASE * (1 + _poll_state['idle_polls'] // 5))
+    return _poll_state['interval']
+
 # Background task to check for price updates
 async def background_price_checker():
     """Background task that polls the API and pushes updates via WebSocket"""
@@ -154,9 +371,10 @@ async def background_price_checker():
     await asyncio.sleep(5)  # Wait 5 seconds before first check
     
     while True:
+        interval = _poll_state['interval']
         try:
-            # Fetch current prices
-            sjc_data = api.get_company_price('sjc')
+            # Fetch current prices (bypassing the response cache)
+            sjc_data = await api.get_company_price('sjc', refresh=True)
             
             if sjc_data:
                 prices = {
@@ -164,8 +382,14 @@ async def background_price_checker():
                 }
                 
                 # Check if prices have changed
-                if manager.has_price_changed(prices):
+                changed = manager.has_price_changed(prices)
+                interval = _next_poll_interval(changed)
+                if changed:
                     print(f"[+] Price change detected at {datetime.now().strftime('%H:%M:%S')}")
+
+                    # Drop older cached responses so other endpoints pick up the new
+                    # prices; the one just fetched with refresh=True is current
+                    api.invalidate('sjc', keep=('sjc', None, None))
                     
                     # Save to CSV if collector available
                     if collector:
@@ -174,12 +398,15 @@ async def background_price_checker():
                             if sjc_data and 'results' in sjc_data:
                                 data['sjc'] = sjc_data['results']
                             if data:
-                                collector.append_to_csv(data)
+                                # Off the event loop; the collector serializes CSV writes
+                                await asyncio.get_running_loop().run_in_executor(
+                                    None, collector.append_to_csv, data)
+                                _on_csv_updated()
                         except Exception as e:
                             print(f"Error saving to CSV: {e}")
                     
                     # Broadcast update to all connected clients
-                    await manager.broadcast({
+                    manager.schedule_broadcast({
                         'type': 'price_update',
                         'timestamp': datetime.now().isoformat(),
                         'prices': prices,
@@ -189,25 +416,83 @@ async def background_price_checker():
         except Exception as e:
             print(f"Error in background price checker: {e}")
         
-        # Wait 60 seconds before next check
-        await asyncio.sleep(60)
-
-# Pydantic models for request/response validation
-class PriceData(BaseModel):
-    timestamp: str
-    company: str
-    data: Dict[str, Any]
-
-class AnalyticsResponse(BaseModel):
-    company: str
-    period_days: int
-    data: Dict[str, Any]
-
-class TrendResponse(BaseModel):
-    period: str
-    days: int
-    trends: Dict[str, Any]
-    moving_average: Optional[Dict[str, Any]] = None
+        # Wait before next check
+        await asyncio.sleep(interval)
+
+# /api/historical-prices responses keyed by (company, days)
+_hist_prices_cache = TTLCache(maxsize=64, ttl=60)
+
+def _on_csv_updated():
+    """Drop cached price history after new prices were appended to the CSV"""
+    _hist_prices_cache.clear()
+
+# Result of the last missing-data fetch, reused for FETCH_MISSING_TTL seconds so
+# the startup check and the dashboard's on-load request don't both hit the API
+FETCH_MISSING_TTL = 5.0
+_fetch_missing_state: Dict[str, Any] = {'at': 0.0, 'result': None}
+_fetch_missing_lock = asyncio.Lock()
+
+async def _do_fetch_missing() -> Dict:
+    """Run collector.fetch_missing_data in a worker thread (shared by startup and the API)"""
+    async with _fetch_missing_lock:
+        if (_fetch_missing_state['result'] is not None
+                and time.monotonic() - _fetch_missing_state['at'] < FETCH_MISSING_TTL):
+            return _fetch_missing_state['result']
+
+        loop = asyncio.get_running_loop()
+        result = await loop.run_in_executor(None, collector.fetch_missing_data)
+        _on_csv_updated()
+
+        _fetch_missing_state.update(at=time.monotonic(), result=result)
+        return result
+
+# CSV gold_type -> (buy field, sell field) in the upstream API response format
+GOLD_TYPE_MAP = {
+    'SJC 1L': ('buy_1l', 'sell_1l'),
+    'SJC Ring 1C': ('buy_nhan1c', 'sell_nhan1c'),
+    'SJC Jewelry 24K': ('buy_nutrang_9999', 'sell_nutrang_9999'),
+    'SJC Jewelry 99%': ('buy_nutrang_99', 'sell_nutrang_99'),
+    'SJC Jewelry 18K': ('buy_nutrang_75', 'sell_nutrang_75'),
+}
+
+# Historical CSV snapshot, reloaded only when the file's mtime changes
+_hist_cache: Dict[str, Any] = {'path': None, 'mtime': None, 'df': None, 'date_index': None}
+
+# Small thread pool for blocking file I/O (created on startup)
+_io_executor: Optional[ThreadPoolExecutor] = None
+
+def _read_csv_sync(csv_file: str) -> Tuple[pd.DataFrame, Dict[str, Any]]:
+    """
+    Read the historical CSV (blocking - run in a worker thread)
+
+    Returns:
+        The DataFrame and an index mapping each date (YYYY-MM-DD) to its row positions
+    """
+    # Keep prices as the original CSV strings so responses match the file exactly
+    df = pd.read_csv(
+        csv_file,
+        usecols=['timestamp', 'company', 'gold_type', 'buy_price', 'sell_price'],
+        dtype=str,
+        keep_default_na=False
+    )
+    # Date part (YYYY-MM-DD) of each timestamp, used for date lookups
+    df['date'] = df['timestamp'].str[:10]
+    date_index = df.groupby('date', sort=False).indices
+    date_index.pop('', None)
+    return df, date_index
+
+async def _load_hist_df(csv_file: str) -> Tuple[pd.DataFrame, Dict[str, Any]]:
+    """Load the historical CSV and its date index, reusing the cached copy if unchanged"""
+    mtime = os.stat(csv_file).st_mtime_ns
+    if _hist_cache['df'] is not None and _hist_cache['path'] == csv_file and _hist_cache['mtime'] == mtime:
+        return _hist_cache['df'], _hist_cache['date_index']
+
+    # Parse off the event loop so WebSocket broadcasts and other requests keep running
+    loop = asyncio.get_running_loop()
+    df, date_index = await loop.run_in_executor(_io_executor, _read_csv_sync, csv_file)
+
+    _hist_cache.update(path=csv_file, mtime=mtime, df=df, date_index=date_index)
+    return df, date_index
 
 # Health check endpoint
 @app.get("/")
@@ -236,13 +521,17 @@ async def health_check():
             "api": "operational",
             "analyzer": "operational" if analyzer else "unavailable",
             "collector": "operational" if collector else "unavailable"
+        },
+        "price_checker": {
+            "poll_interval_seconds": _poll_state['interval'],
+            "idle_polls": _poll_state['idle_polls']
         }
     }
 
 @app.get("/api/current-prices")
 async def get_current_prices(save_to_csv: bool = Query(True, description="Save current prices to CSV")):
     """Get current gold prices from SJC only (DOJI and PNJ removed)"""
-    sjc_data = api.get_company_price('sjc')
+    sjc_data = await api.get_company_price('sjc')
 
     # Save to CSV if requested and collector is available
     if save_to_csv and collector:
@@ -252,7 +541,9 @@ async def get_current_prices(save_to_csv: bool = Query(True, description="Save c
                 data['sjc'] = sjc_data['results']
 
             if data:
-                collector.append_to_csv(data)
+                # Off the event loop; the collector serializes CSV writes
+                await asyncio.get_running_loop().run_in_executor(None, collector.append_to_csv, data)
+                _on_csv_updated()
         except Exception as e:
             print(f"Error saving to CSV: {e}")
 
@@ -271,7 +562,7 @@ async def update_historical_data():
         raise HTTPException(status_code=503, detail="Data collector service unavailable")
 
     try:
-        result = collector.fetch_missing_data()
+        result = await _do_fetch_missing()
         return {
             'success': True,
             'timestamp': datetime.now().isoformat(),
@@ -289,28 +580,13 @@ async def get_available_dates():
         raise HTTPException(status_code=503, detail="Data collector service unavailable")
 
     try:
-        import csv
-        import os
-        from collections import OrderedDict
-
-        csv_file = os.path.join(collector.DATA_DIR, 'historical_gold_prices.csv')
-
-        if not os.path.exists(csv_file):
+        if not os.path.exists(HISTORICAL_CSV):
             return {'dates': []}
 
-        # Read all unique dates from CSV
-        dates_set = set()
-        with open(csv_file, 'r', encoding='utf-8') as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                timestamp = row.get('timestamp', '')
-                if timestamp:
-                    # Extract just the date part (YYYY-MM-DD)
-                    date_part = timestamp.split(' ')[0] if ' ' in timestamp else timestamp
-                    dates_set.add(date_part)
+        _, date_index = await _load_hist_df(HISTORICAL_CSV)
 
-        # Sort dates in descending order (newest first)
-        dates_list = sorted(list(dates_set), reverse=True)
+        # Unique dates, sorted in descending order (newest first)
+        dates_list = sorted(date_index, reverse=True)
 
         return {
             'dates': dates_list,
@@ -328,49 +604,27 @@ async def get_prices_by_date(date: str = Query(..., description="Date in YYYY-MM
         raise HTTPException(status_code=503, detail="Data collector service unavailable")
 
     try:
-        import csv
-        import os
+        if not os.path.exists(HISTORICAL_CSV):
+            raise HTTPException(status_code=404, detail="Historical data file not found")
 
-        csv_file = os.path.join(collector.DATA_DIR, 'historical_gold_prices.csv')
+        df, date_index = await _load_hist_df(HISTORICAL_CSV)
 
-        if not os.path.exists(csv_file):
-            raise HTTPException(status_code=404, detail="Historical data file not found")
+        positions = date_index.get(date)
+        if positions is None:
+            raise HTTPException(status_code=404, detail=f"No data found for date {date}")
+
+        # Only process SJC data for the specified date
+        day_rows = df.iloc[positions]
+        day_rows = day_rows[day_rows['company'] == 'SJC']
 
-        # Read prices for the specified date
         sjc_prices = {}
 
-        with open(csv_file, 'r', encoding='utf-8') as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                timestamp = row.get('timestamp', '')
-                if not timestamp.startswith(date):
-                    continue
-
-                company = row.get('company', '')
-                gold_type = row.get('gold_type', '')
-                buy_price = row.get('buy_price', '')
-                sell_price = row.get('sell_price', '')
-
-                # Only process SJC data
-                if company != 'SJC':
-                    continue
-
-                # Map gold types to API field names
-                if gold_type == 'SJC 1L':
-                    sjc_prices['buy_1l'] = buy_price
-                    sjc_prices['sell_1l'] = sell_price
-                elif gold_type == 'SJC Ring 1C':
-                    sjc_prices['buy_nhan1c'] = buy_price
-                    sjc_prices['sell_nhan1c'] = sell_price
-                elif gold_type == 'SJC Jewelry 24K':
-                    sjc_prices['buy_nutrang_9999'] = buy_price
-                    sjc_prices['sell_nutrang_9999'] = sell_price
-                elif gold_type == 'SJC Jewelry 99%':
-                    sjc_prices['buy_nutrang_99'] = buy_price
-                    sjc_prices['sell_nutrang_99'] = sell_price
-                elif gold_type == 'SJC Jewelry 18K':
-                    sjc_prices['buy_nutrang_75'] = buy_price
-                    sjc_prices['sell_nutrang_75'] = sell_price
+        for gold_type, buy_price, sell_price in zip(day_rows['gold_type'], day_rows['buy_price'], day_rows['sell_price']):
+            # Map gold types to API field names
+            fields = GOLD_TYPE_MAP.get(gold_type)
+            if fields:
+                sjc_prices[fields[0]] = buy_price
+                sjc_prices[fields[1]] = sell_price
 
         if not sjc_prices:
             raise HTTPException(status_code=404, detail=f"No data found for date {date}")
@@ -393,18 +647,25 @@ async def get_historical_prices(
     days: int = Query(7, description="Number of days to fetch", ge=1, le=365)
 ):
     """Get historical gold prices for SJC only (DOJI and PNJ removed)"""
-    date_to = datetime.now().strftime('%Y-%m-%d')
-    date_from = (datetime.now() - timedelta(days=days)).strftime('%Y-%m-%d')
-
     company_lower = company.lower()
     if company_lower not in ['sjc']:
         raise HTTPException(status_code=400, detail="Invalid company. Must be sjc")
 
-    data = api.get_company_price(company_lower, date_from, date_to)
+    key = (company_lower, days)
+    cached = _hist_prices_cache.get(key)
+    if cached is not None:
+        return cached
+
+    now = datetime.now()
+    date_to = now.strftime('%Y-%m-%d')
+    date_from = (now - timedelta(days=days)).strftime('%Y-%m-%d')
+
+    data = await api.get_company_price(company_lower, date_from, date_to)
 
     if not data:
         raise HTTPException(status_code=500, detail="Failed to fetch data from API")
 
+    _hist_prices_cache[key] = data
     return data
 
 @app.get("/api/analytics/price-change")
@@ -489,7 +750,11 @@ async def get_trends(
         return {
             'period': period,
             'days': days,
-            'trends': trends_data,
+            'trends': {
+                'dates': trends_data['dates'],
+                'buy_prices': trends_data['buy_prices'].tolist(),
+                'sell_prices': trends_data['sell_prices'].tolist()
+            },
             'moving_average': ma_data
         }
     except Exception as e:
@@ -509,28 +774,75 @@ async def get_company_comparison(
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+def _refresh_export_gzip(csv_file: str) -> str:
+    """Write a gzip copy of the CSV next to it unless it is already up to date"""
+    gz_file = csv_file + '.gz'
+    if os.path.exists(gz_file) and os.path.getmtime(gz_file) >= os.path.getmtime(csv_file):
+        return gz_file
+
+    # A unique temp name, so workers refreshing at the same time don't share one
+    fd, tmp_file = tempfile.mkstemp(dir=os.path.dirname(gz_file) or '.',
+                                    prefix='.' + os.path.basename(gz_file) + '.', suffix='.tmp')
+    try:
+        with open(csv_file, 'rb') as src, os.fdopen(fd, 'wb') as raw, \
+                gzip.GzipFile(fileobj=raw, mode='wb', compresslevel=6) as dst:
+            shutil.copyfileobj(src, dst, 1 << 20)
+        os.replace(tmp_file, gz_file)
+    finally:
+        if os.path.exists(tmp_file):
+            os.remove(tmp_file)
+    return gz_file
+
+def _open_export_gzip(csv_file: str):
+    """Open the up-to-date gzip copy of the CSV; returns the file and its size"""
+    f = open(_refresh_export_gzip(csv_file), 'rb')
+    # Size of the file actually being served, even if a refresh replaces it meanwhile
+    return f, os.fstat(f.fileno()).st_size
+
+def _iter_file(f, chunk_size: int = 64 * 1024):
+    """Yield an open file in chunks and close it (Starlette runs sync iterators in its threadpool)"""
+    with f:
+        while chunk := f.read(chunk_size):
+            yield chunk
+
 @app.get("/api/export/csv")
-async def export_csv():
+async def export_csv(request: Request):
     """Export historical data as CSV"""
-    csv_file = 'historical_data/historical_gold_prices.csv'
-    
-    if not os.path.exists(csv_file):
+    if not os.path.exists(HISTORICAL_CSV):
         raise HTTPException(status_code=404, detail="Historical data not available")
     
-    return FileResponse(
-        csv_file,
+    if 'gzip' not in request.headers.get('accept-encoding', ''):
+        return FileResponse(
+            HISTORICAL_CSV,
+            media_type='text/csv',
+            filename='gold_prices_export.csv'
+        )
+
+    # Serve the precompressed copy; the client decodes it and saves plain CSV
+    loop = asyncio.get_running_loop()
+    gz_handle, gz_size = await loop.run_in_executor(_io_executor, _open_export_gzip, HISTORICAL_CSV)
+
+    return StreamingResponse(
+        _iter_file(gz_handle),
         media_type='text/csv',
-        filename='gold_prices_export.csv'
+        headers={
+            'Content-Encoding': 'gzip',
+            'Content-Length': str(gz_size),
+            'Content-Disposition': 'attachment; filename="gold_prices_export.csv"',
+            'Vary': 'Accept-Encoding'
+        }
     )
 
 @app.post("/api/data/update")
-async def update_historical_data():
+async def update_latest_data():
     """Update historical data with latest prices"""
     if not collector:
         raise HTTPException(status_code=500, detail="Data collector unavailable")
     
     try:
-        collector.update_csv_with_latest()
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, collector.update_csv_with_latest)
+        _on_csv_updated()
         return {
             'status': 'success',
             'message': 'Historical data updated',
@@ -552,22 +864,21 @@ async def websocket_endpoint(websocket: WebSocket):
     
     try:
         # Send initial connection confirmation
-        await websocket.send_json({
+        await manager.send_message(websocket, {
             'type': 'connection',
             'status': 'connected',
             'message': 'WebSocket connection established',
             'timestamp': datetime.now().isoformat()
         })
         
-        # Keep connection alive and listen for messages
+        # Keep the connection open until the client disconnects. Keepalive uses
+        # protocol-level ping/pong frames (uvicorn ws_ping_interval/ws_ping_timeout),
+        # so incoming client messages are ignored.
         while True:
             try:
-                # Wait for any client messages (ping/pong, etc.)
-                data = await websocket.receive_text()
-                
-                # Handle ping/pong
-                if data == 'ping':
-                    await websocket.send_text('pong')
+                message = await websocket.receive()
+                if message['type'] == 'websocket.disconnect':
+                    break
             
             except WebSocketDisconnect:
                 break
@@ -582,6 +893,8 @@ async def websocket_endpoint(websocket: WebSocket):
 @app.on_event("startup")
 async def startup_event():
     """Start background tasks when the app starts"""
+    global _io_executor
+
     print("=" * 60)
     print("[*] Starting FastAPI application...")
     print("=" * 60)
@@ -590,7 +903,7 @@ async def startup_event():
     if collector:
         print("\n[*] Checking for missing historical data...")
         try:
-            result = collector.fetch_missing_data()
+            result = await _do_fetch_missing()
             print(f"[+] Status: {result.get('status')}")
             print(f"[+] {result.get('message')}")
             if result.get('records_added', 0) > 0:
@@ -601,6 +914,10 @@ async def startup_event():
             print(f"[-] Error updating historical data: {e}")
         print()
     
+    # Open the shared upstream HTTP client and the file I/O thread pool
+    api.open()
+    _io_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="csv-io")
+
     # Start background price checker
     asyncio.create_task(background_price_checker())
     
@@ -608,6 +925,16 @@ async def startup_event():
     print("[+] WebSocket endpoint ready at /ws/prices")
     print("=" * 60)
 
+# Shutdown event to release resources
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Close the upstream HTTP clients and the file I/O thread pool when the app stops"""
+    await api.close()
+    if collector:
+        collector.close()
+    if _io_executor is not None:
+        _io_executor.shutdown(wait=False)
+
 # Run with: uvicorn api_fastapi:app --reload --port 8000
 if __name__ == "__main__":
     import uvicorn
@@ -618,5 +945,15 @@ if __name__ == "__main__":
     print("API Documentation: http://localhost:8000/api/docs")
     print("Press Ctrl+C to stop the server")
     print("=" * 60)
-    uvicorn.run("api_fastapi:app", host="0.0.0.0", port=8000, reload=True)
+
+    # uvloop (libuv event loop) is installed by uvicorn[standard] on Linux/macOS
+    # but is not available on Windows, so only request it when importable
+    try:
+        import uvloop  # noqa: F401
+        loop = "uvloop"
+    except ImportError:
+        loop = "asyncio"
+
+    uvicorn.run("api_fastapi:app", host="0.0.0.0", port=8000, reload=True,
+                loop=loop, http="httptools", ws_ping_interval=20, ws_ping_timeout=20)
 
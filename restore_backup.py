@@ -4,6 +4,30 @@ Restore CSV from backup
 
 import shutil
 import os
+import tempfile
+
+def _fast_copy(src, dst):
+    """
+    Copy src over dst atomically: copy to a temp file next to dst, flush it
+    to disk, then rename it into place so a crash never leaves a half-written CSV
+    """
+    # A unique temp name, so concurrent writers never share one
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(dst) or '.',
+                               prefix='.' + os.path.basename(dst) + '.', suffix='.tmp')
+    os.close(fd)
+    try:
+        # copyfile uses os.sendfile on Linux (and fcopyfile on macOS) to copy
+        # in the kernel; elsewhere it falls back to large buffered reads
+        shutil.copyfile(src, tmp)
+        with open(tmp, 'rb+') as f:
+            os.fsync(f.fileno())
+        # mkstemp creates the file as 0600: keep the CSV's own permission bits,
+        # or the backup's when there is no CSV yet (as shutil.copy did)
+        shutil.copymode(dst if os.path.exists(dst) else src, tmp)
+        os.replace(tmp, dst)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
 
 def main():
     csv_file = 'historical_data/historical_gold_prices.csv'
@@ -19,7 +43,7 @@ def main():
     print("=" * 60)
     
     # Restore
-    shutil.copy(backup_file, csv_file)
+    _fast_copy(backup_file, csv_file)
     
     print(f"✓ Restored: {csv_file}")
     print(f"✓ From:     {backup_file}")